@@ -1,4 +1,3 @@
-
 bl_info = {
     "name": "Rune Synergy Addon",
     "author": "Dane",
@@ -8,11 +7,17 @@ bl_info = {
     "category": "Import-Export",
 }
 
-import bpy
 import sys
 import os
 import importlib
 
+# the data, codec and pack modules are usable without blender, only the
+# operators need bpy
+try:
+    import bpy
+except ImportError:
+    bpy = None
+
 for filename in [ f for f in os.listdir(os.path.dirname(os.path.realpath(__file__))) if f.endswith(".py") ]:
     if filename == os.path.basename(__file__):
         continue
@@ -20,14 +25,15 @@ for filename in [ f for f in os.listdir(os.path.dirname(os.path.realpath(__file_
     if module:
         importlib.reload(module)
 
-# clear out any scene update funcs hanging around, e.g. after a script reload
-for collection in [bpy.app.handlers.depsgraph_update_post, bpy.app.handlers.load_post]:
-    for func in collection:
-        if func.__module__.startswith(__name__):
-            collection.remove(func)
+if bpy is not None:
+    # clear out any scene update funcs hanging around, e.g. after a script reload
+    for collection in [bpy.app.handlers.depsgraph_update_post, bpy.app.handlers.load_post]:
+        for func in collection:
+            if func.__module__.startswith(__name__):
+                collection.remove(func)
 
-from . import model, rig, animation
-__modules_ = (model, rig, animation)
+    from . import profiling, model, rig, animation, watch
+    __modules_ = (profiling, model, rig, animation, watch)
 
 def register():
     for module in __modules_:
@@ -1,10 +1,28 @@
-
+import os
+import re
 import bpy
+import fnmatch
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
 
+from mathutils import Euler, Quaternion
 from bpy.types import Operator
 from bpy.props import *
 from bpy_extras.io_utils import ExportHelper
 
+from . import codec, profiling, sampling
+
+POSE_PATH = re.compile(r'^pose\.bones\["(.+)"\]\.(location|rotation_euler|rotation_quaternion|scale)$')
+
+# rest values of every channel, used for components that have no fcurve
+CHANNEL_DEFAULTS = {
+    "location": (0.0, 0.0, 0.0),
+    "rotation_euler": (0.0, 0.0, 0.0),
+    "rotation_quaternion": (1.0, 0.0, 0.0, 0.0),
+    "scale": (1.0, 1.0, 1.0),
+}
+
 def get_armature_actions(armature):
     actions = set()
 
@@ -26,14 +44,220 @@ def get_actions(self, context):
 
     if armature and armature.type == 'ARMATURE':
         armature_actions = get_armature_actions(armature)
-        for action in armature_actions:
-            actions.append((action.name, action.name, "", 'ACTION', 0))
+        for index, action in enumerate(sorted(armature_actions, key=lambda action: action.name)):
+            actions.append((action.name, action.name, "", 'ACTION', index))
     else:
         actions.append(('None', "No Armature", ""))
 
     return actions
 
+# The rotation curves blender uses for a bone in the given rotation mode.
+def get_rotation_channel(rotation_mode):
+    if rotation_mode == 'QUATERNION':
+        return "rotation_quaternion"
+    if rotation_mode == 'AXIS_ANGLE':
+        return None
+    return "rotation_euler"
+
+# Without pose bones every curve of the action is sampled and eulers are
+# taken to be in blender's default XYZ order.
+def sample_action(action, pose_bones=None):
+    rotation_modes = None if pose_bones is None else {bone.name: bone.rotation_mode for bone in pose_bones}
+    curves = {}
+
+    for fcurve in action.fcurves:
+        match = POSE_PATH.match(fcurve.data_path)
+        if not match:
+            continue
+        bone_name, channel = match.groups()
+        if rotation_modes is not None:
+            if bone_name not in rotation_modes:
+                continue
+            # an action can key both rotations, only the one of the bone's mode counts
+            if channel.startswith("rotation_") and channel != get_rotation_channel(rotation_modes[bone_name]):
+                continue
+        curves.setdefault((bone_name, channel), {})[fcurve.array_index] = fcurve
+
+    if rotation_modes is None:
+        for bone_name, channel in list(curves):
+            if channel == "rotation_quaternion":
+                curves.pop((bone_name, "rotation_euler"), None)
+
+    # every frame of the action is sampled, curves move between their keys
+    # too, and reduce_samples drops the frames that turn out to be redundant
+    start, end = action.frame_range
+    start = int(round(start))
+    end = int(round(end))
+
+    frames = np.arange(start, max(start, end) + 1, dtype=np.int32)
+    durations = np.ones(len(frames), dtype=np.int32)
+
+    frame_list = frames.tolist()
+    channels = {}
+
+    for (bone_name, channel), components in curves.items():
+        defaults = CHANNEL_DEFAULTS[channel]
+        values = np.empty((len(frame_list), len(defaults)), dtype=np.float64)
+
+        for axis, default in enumerate(defaults):
+            fcurve = components.get(axis)
+            if fcurve is None:
+                values[:, axis] = default
+            else:
+                values[:, axis] = [fcurve.evaluate(frame) for frame in frame_list]
+
+        # exported rotations are ZXY eulers
+        if channel == "rotation_quaternion":
+            channel = "rotation_euler"
+            values = np.array([Quaternion(q).to_euler('ZXY') for q in values], dtype=np.float64).reshape(-1, 3)
+        elif channel == "rotation_euler":
+            order = 'XYZ' if rotation_modes is None else rotation_modes[bone_name]
+            if order != 'ZXY':
+                values = np.array([Euler(e, order).to_matrix().to_euler('ZXY') for e in values], dtype=np.float64).reshape(-1, 3)
+
+        channels[(bone_name, channel)] = values
+
+    return sampling.ActionSamples(action.name, frames, durations, channels)
+
+def Export(context, filepath, action_name, mode='BINARY', all_actions=False, tolerance=None, report=None):
+    armature_obj = context.active_object
+
+    if not armature_obj or armature_obj.type != 'ARMATURE':
+        print("Unable to export animation: no armature")
+        return {'CANCELLED'}
+
+    if all_actions:
+        actions = sorted(get_armature_actions(armature_obj), key=lambda action: action.name)
+    else:
+        actions = [bpy.data.actions.get(action_name)]
+
+    if not actions or None in actions:
+        print("Unable to export animation: no action named", action_name)
+        return {'CANCELLED'}
+
+    with profiling.span("sample"):
+        samples_list = [sample_action(action, armature_obj.pose.bones) for action in actions]
+
+    sample_count, frame_count, error = export_samples(filepath, samples_list, mode, tolerance)
+
+    if tolerance is not None:
+        message = "Reduced {} frames to {} (max error {:.2f})".format(sample_count, frame_count, error)
+        print(message)
+        if report:
+            report({'INFO'}, message)
+
+    return {'FINISHED'}
+
+# Everything after sampling only touches the sampled arrays, so this is safe to
+# run off the main thread. Returns the frame count before and after reduction
+# and the reduction error.
+def export_samples(filepath, samples_list, mode='BINARY', tolerance=None):
+    sample_count = sum(len(samples.frames) for samples in samples_list)
+    error = 0.0
+
+    if tolerance is not None:
+        with profiling.span("reduce"):
+            reduced = [sampling.reduce_samples(samples, tolerance) for samples in samples_list]
+        samples_list = [samples for samples, _ in reduced]
+        error = max((error for _, error in reduced), default=0.0)
+
+    with profiling.span("archive"):
+        archive = sampling.build_archive(samples_list)
+
+    with profiling.span("encode"):
+        buffer = codec.encode_animation(archive, mode)
+
+    with profiling.span("write"):
+        with open(filepath, "wb") as file:
+            file.write(buffer)
+
+    return sample_count, sum(len(samples.frames) for samples in samples_list), error
+
+# File names of the actions. Cleaning maps e.g. "Walk.L" and "Walk_L" to the
+# same name, later actions get a numbered suffix rather than overwriting it.
+def get_file_names(actions):
+    names = []
+    used = set()
+
+    for action in actions:
+        base = bpy.path.clean_name(action.name)
+        name = base
+        suffix = 1
+
+        # case insensitive, as the file systems of windows and macos are
+        while name.lower() in used:
+            name = "{}.{:03d}".format(base, suffix)
+            suffix += 1
+
+        if name != base:
+            print("Exporting action", action.name, "as", name, "to not overwrite another action")
+
+        used.add(name.lower())
+        names.append(name)
+
+    return names
+
+def ExportBatch(context, directory, pattern="*", mode='BINARY', tolerance=None, report=None):
+    armature_obj = context.active_object
+
+    if not armature_obj or armature_obj.type != 'ARMATURE':
+        print("Unable to export animations: no armature")
+        return {'CANCELLED'}
+
+    actions = [
+        action for action in sorted(get_armature_actions(armature_obj), key=lambda action: action.name)
+        if fnmatch.fnmatchcase(action.name, pattern)
+    ]
+
+    if not actions:
+        print("Unable to export animations: no action matches", pattern)
+        return {'CANCELLED'}
+
+    os.makedirs(directory, exist_ok=True)
+
+    # blender data can only be read from the main thread, so sample every
+    # action up front and hand the arrays to the pool for encoding and writing
+    with profiling.span("sample"):
+        jobs = [
+            (os.path.join(directory, name + ".anim"), sample_action(action, armature_obj.pose.bones))
+            for name, action in zip(get_file_names(actions), actions)
+        ]
+
+    results = []
+    failed = 0
+
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        futures = [executor.submit(export_samples, filepath, [samples], mode, tolerance) for filepath, samples in jobs]
+
+        # a failed write only loses its own action, the others still export
+        for (filepath, samples), future in zip(jobs, futures):
+            try:
+                results.append(future.result())
+            except (OSError, ValueError) as error:
+                failed += 1
+                message = "Unable to export animation {} to {}: {}".format(samples.name, filepath, error)
+                print(message)
+                if report:
+                    report({'WARNING'}, message)
+
+    if not results:
+        return {'CANCELLED'}
+
+    message = "Exported {} animations, {} frames".format(len(results), sum(frame_count for _, frame_count, _ in results))
+    if tolerance is not None:
+        message += " reduced from {} (max error {:.2f})".format(
+            sum(sample_count for sample_count, _, _ in results),
+            max(error for _, _, error in results))
+    if failed:
+        message += ", {} failed".format(failed)
+    print(message)
+    if report:
+        report({'WARNING'} if failed else {'INFO'}, message)
+
+    return {'FINISHED'}
+
 class RS_OT_ExportAnim(Operator, ExportHelper):
+    """Exports an action of the active armature"""
     bl_idname = "rs.export_anim"
     bl_label = "Rune Synergy (.anim)"
     filename_ext = ".anim"
@@ -42,18 +266,100 @@ class RS_OT_ExportAnim(Operator, ExportHelper):
         options={'HIDDEN'},
         maxlen=255,
     )
-    
+
     action_list: EnumProperty(name="Action", items=get_actions)
 
+    mode: EnumProperty(
+        name="Format",
+        items=(
+            ('BINARY', "Binary", "Protobuf encoded AnimationArchive message"),
+            ('JSON', "JSON", "JSON encoding of the same structure"),
+        ),
+        default='BINARY',
+    )
+
+    all_actions: BoolProperty(
+        name="All Actions",
+        description="Exports every action of the armature, including NLA strips, into one archive sharing identical frames",
+        default=False,
+    )
+
+    reduce_frames: BoolProperty(
+        name="Reduce Frames",
+        description="Drops frames that can be interpolated from their neighbours within the tolerance",
+        default=True,
+    )
+
+    tolerance: FloatProperty(
+        name="Tolerance",
+        description="Largest allowed error of a dropped frame, in exported units (1/2048 of a turn for rotations)",
+        default=1.0,
+        min=0.0,
+    )
+
+    def execute(self, context):
+        return profiling.profile(context, "Export animation", lambda: Export(context, self.filepath, self.action_list,
+            mode = self.mode,
+            all_actions = self.all_actions,
+            tolerance = self.tolerance if self.reduce_frames else None,
+            report = self.report,
+        ), self.report)
+
+class RS_OT_ExportAnimBatch(Operator):
+    """Exports every action of the active armature to a directory"""
+    bl_idname = "rs.export_anim_batch"
+    bl_label = "Rune Synergy Actions (.anim)"
+
+    directory: StringProperty(subtype='DIR_PATH')
+
+    pattern: StringProperty(
+        name="Filter",
+        description="Only exports actions whose name matches this wildcard pattern",
+        default="*",
+    )
+
+    mode: EnumProperty(
+        name="Format",
+        items=(
+            ('BINARY', "Binary", "Protobuf encoded AnimationArchive message"),
+            ('JSON', "JSON", "JSON encoding of the same structure"),
+        ),
+        default='BINARY',
+    )
+
+    reduce_frames: BoolProperty(
+        name="Reduce Frames",
+        description="Drops frames that can be interpolated from their neighbours within the tolerance",
+        default=True,
+    )
+
+    tolerance: FloatProperty(
+        name="Tolerance",
+        description="Largest allowed error of a dropped frame, in exported units (1/2048 of a turn for rotations)",
+        default=1.0,
+        min=0.0,
+    )
+
+    def invoke(self, context, event):
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
     def execute(self, context):
-        obj = context.active_object
-        print("Active:", obj)
-        return {'FINISHED'}
+        return profiling.profile(context, "Export animations", lambda: ExportBatch(context, self.directory,
+            pattern = self.pattern,
+            mode = self.mode,
+            tolerance = self.tolerance if self.reduce_frames else None,
+            report = self.report,
+        ), self.report)
 
 __classes__ = (
     RS_OT_ExportAnim,
+    RS_OT_ExportAnimBatch,
 )
 
 __extensions__ = {
-    bpy.types.TOPBAR_MT_file_export: [ lambda self, context: self.layout.operator(RS_OT_ExportAnim.bl_idname) ],
-}
\ No newline at end of file
+    bpy.types.TOPBAR_MT_file_export: [
+        lambda self, context: self.layout.operator(RS_OT_ExportAnim.bl_idname),
+        lambda self, context: self.layout.operator(RS_OT_ExportAnimBatch.bl_idname),
+    ],
+}
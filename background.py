@@ -0,0 +1,159 @@
+import threading
+
+from bpy.props import BoolProperty
+
+from . import profiling
+
+# Runs the encode and write half of an export on a worker thread while a
+# modal operator keeps blender responsive. The operator snapshots everything
+# it needs from blender first, the job must not touch bpy.
+
+class Cancelled(Exception):
+    pass
+
+# The job records into its own profile, other operators profiled meanwhile
+# don't mix their spans into it.
+class Job:
+    __slots__ = ("thread", "phase", "progress", "cancelled", "error", "done", "status", "profile")
+
+    def __init__(self, func, profile=None):
+        self.profile = profile
+        self.phase = "starting"
+        self.progress = 0.0
+        self.cancelled = False
+        self.error = None
+        self.done = False
+        self.status = 'CANCELLED'
+
+        self.thread = threading.Thread(target=self.run, args=(func,), daemon=True)
+        self.thread.start()
+
+    def run(self, func):
+        try:
+            with profiling.recording(self.profile):
+                func(self.step)
+            self.status = 'FINISHED'
+        except Cancelled:
+            pass
+        except Exception as error:
+            self.error = error
+        finally:
+            self.done = True
+
+    # called by the job between its phases, this is where a cancel takes effect
+    def step(self, phase, progress):
+        if self.cancelled:
+            raise Cancelled()
+        self.phase = phase
+        self.progress = progress
+
+    def cancel(self):
+        self.cancelled = True
+
+# Mixin for export operators. execute() snapshots and calls start_job() with
+# the rest of the export, modal() then reports progress in the status bar
+# until the job is done. Escape cancels, the target file is left untouched.
+#
+# Only exports started from the file browser go to the background. A script
+# calling the operator expects the file to be written once the call returns.
+class BackgroundExport:
+    job = None
+    timer = None
+    title = "Exporting"
+    profile = None
+    invoked = False
+
+    use_background: BoolProperty(
+        name="Background",
+        description="Encodes and writes the file on a worker thread while blender stays responsive",
+        default=True,
+    )
+
+    def invoke(self, context, event):
+        self.invoked = True
+        return super().invoke(context, event)
+
+    def runs_in_background(self):
+        return self.use_background and self.invoked
+
+    # Takes the snapshot with func. When the scene is profiled, the profile
+    # covers the snapshot and the job and is reported once the job is done.
+    # A None snapshot cancels the export.
+    def take_snapshot(self, context, name, func):
+        self.profile = profiling.begin(context, name)
+        snapshot = None
+
+        try:
+            snapshot = func()
+        finally:
+            if self.profile is not None:
+                profiling.detach(self.profile)
+            if snapshot is None:
+                self.finish_profile()
+
+        return snapshot
+
+    def finish_profile(self):
+        if self.profile is not None:
+            profiling.finish(self.profile, self.report)
+            self.profile = None
+
+    # the profile goes with the job from here on
+    def start_job(self, context, title, func):
+        self.title = title
+        self.job = Job(func, self.profile)
+        self.profile = None
+        self.timer = context.window_manager.event_timer_add(0.1, window=context.window)
+        context.window_manager.modal_handler_add(self)
+        context.window_manager.progress_begin(0, 100)
+        self.update_status(context)
+        return {'RUNNING_MODAL'}
+
+    def update_status(self, context):
+        job = self.job
+        text = "{}: {} {:.0%}".format(self.title, job.phase, job.progress)
+        if job.cancelled:
+            text += ", cancelling"
+        else:
+            text += ", Esc to cancel"
+        context.workspace.status_text_set(text)
+        context.window_manager.progress_update(job.progress * 100)
+
+    def modal(self, context, event):
+        job = self.job
+
+        if event.type == 'ESC' and event.value == 'PRESS':
+            job.cancel()
+
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+
+        if not job.done:
+            self.update_status(context)
+            return {'PASS_THROUGH'}
+
+        self.finish(context)
+
+        if job.error is not None:
+            self.report({'ERROR'}, "{} failed: {}".format(self.title, job.error))
+            return {'CANCELLED'}
+
+        if job.status == 'CANCELLED':
+            self.report({'INFO'}, "{} cancelled".format(self.title))
+            return {'CANCELLED'}
+
+        self.report({'INFO'}, "{} finished".format(self.title))
+        return {'FINISHED'}
+
+    # blender cancels running modal operators, e.g. when a file is loaded
+    def cancel(self, context):
+        self.job.cancel()
+        self.finish(context)
+
+    def finish(self, context):
+        context.window_manager.event_timer_remove(self.timer)
+        context.window_manager.progress_end()
+        context.workspace.status_text_set(None)
+
+        if self.job.profile is not None:
+            profiling.finish(self.job.profile, self.report)
@@ -0,0 +1,263 @@
+# Benchmarks of the codecs and, when run inside blender, of the import and
+# export operators on synthetic assets.
+#
+#   python benchmarks/run.py --output results.json
+#   blender --background --factory-startup --python benchmarks/run.py -- \
+#       --output results.json --baseline baseline.json
+#
+# Every benchmark records the minimum and median of its repeats. With a
+# baseline, benchmarks whose minimum got slower by more than the threshold
+# are reported and the run exits with status 1.
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+import numpy as np
+import synthetic
+
+try:
+    import bpy
+except ImportError:
+    bpy = None
+
+MESH_SIZES = (1000, 10000, 100000, 500000)
+RIG_SIZES = (10, 100, 500)
+ANIMATION_SIZES = ((10, 100), (50, 500), (100, 1000))
+
+# bone ids are a byte, so exported rigs can have at most 255 bones
+BLENDER_RIG_SIZES = (10, 100, 250)
+
+class Benchmarks:
+    __slots__ = ("results", "repeat", "only")
+
+    def __init__(self, repeat=5, only=None):
+        self.results = {}
+        self.repeat = repeat
+        self.only = only
+
+    # Times func, after running setup before every repeat outside of the timing.
+    def run(self, name, func, setup=None, repeat=None, **info):
+        if self.only and not any(pattern in name for pattern in self.only):
+            return
+
+        times = []
+        for _ in range(repeat or self.repeat):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+
+        result = dict(info, min=min(times), median=statistics.median(times), repeat=len(times))
+        self.results[name] = result
+        print("{:<48} {:>10.2f} ms {:>10.2f} ms".format(name, result["min"] * 1000, result["median"] * 1000))
+
+def run_codec_benchmarks(benchmarks, directory):
+    codec = synthetic.load_module("codec")
+    pack = synthetic.load_module("pack")
+    optimize = synthetic.load_module("optimize")
+
+    for face_count in MESH_SIZES:
+        mesh = synthetic.make_mesh(face_count)
+        info = {"faces": mesh.face_count, "vertices": mesh.vertex_count}
+        repeat = 3 if face_count >= 100000 else None
+
+        for mode in ("BINARY", "JSON"):
+            buffer = codec.encode_model(mesh, mode)
+            benchmarks.run("codec/model/encode/{}/{}".format(mode.lower(), face_count), lambda: codec.encode_model(mesh, mode), repeat=repeat, bytes=len(buffer), **info)
+            benchmarks.run("codec/model/decode/{}/{}".format(mode.lower(), face_count), lambda: codec.decode_model(buffer, mode), repeat=repeat, bytes=len(buffer), **info)
+
+        pack_path = os.path.join(directory, "bench.rspk")
+        benchmarks.run("pack/model/write/{}".format(face_count), lambda: pack.write_model(pack_path, "model", mesh), setup=lambda: os.path.exists(pack_path) and os.remove(pack_path), repeat=repeat, **info)
+
+        def read_pack():
+            with pack.PackFile(pack_path) as pack_file:
+                pack_file.read_model("model", verify=True)
+
+        benchmarks.run("pack/model/read/{}".format(face_count), read_pack, repeat=repeat, **info)
+        benchmarks.run("optimize/model/{}".format(face_count), lambda: optimize.optimize_mesh(mesh), repeat=repeat, **info)
+
+    for bone_count in RIG_SIZES:
+        rig = synthetic.make_rig(bone_count)
+        for mode in ("BINARY", "JSON"):
+            buffer = codec.encode_rig(rig, mode)
+            benchmarks.run("codec/rig/encode/{}/{}".format(mode.lower(), bone_count), lambda: codec.encode_rig(rig, mode), bones=bone_count)
+            benchmarks.run("codec/rig/decode/{}/{}".format(mode.lower(), bone_count), lambda: codec.decode_rig(buffer, mode), bones=bone_count)
+
+    for bone_count, frame_count in ANIMATION_SIZES:
+        archive = synthetic.make_animation(bone_count, frame_count)
+        info = {"bones": bone_count, "frames": frame_count * len(archive.animations)}
+        size = "{}x{}".format(bone_count, frame_count)
+        for mode in ("BINARY", "JSON"):
+            buffer = codec.encode_animation(archive, mode)
+            benchmarks.run("codec/animation/encode/{}/{}".format(mode.lower(), size), lambda: codec.encode_animation(archive, mode), repeat=3, bytes=len(buffer), **info)
+            benchmarks.run("codec/animation/decode/{}/{}".format(mode.lower(), size), lambda: codec.decode_animation(buffer, mode), repeat=3, bytes=len(buffer), **info)
+
+def clear_scene():
+    for obj in list(bpy.data.objects):
+        bpy.data.objects.remove(obj)
+    for collection in (bpy.data.meshes, bpy.data.armatures, bpy.data.materials, bpy.data.actions):
+        for block in list(collection):
+            collection.remove(block)
+
+def import_model(model, path):
+    clear_scene()
+    model.ImportFiles(bpy.context, [path], use_cache=False, reuse_meshes=False)
+    return bpy.context.view_layer.objects.active
+
+def run_blender_benchmarks(benchmarks, directory):
+    addon = synthetic.load_addon()
+    addon.register()
+
+    codec = synthetic.load_module("codec")
+    model = synthetic.load_module("model")
+    rig = synthetic.load_module("rig")
+    animation = synthetic.load_module("animation")
+
+    context = bpy.context
+
+    try:
+        for face_count in MESH_SIZES:
+            mesh = synthetic.make_mesh(face_count)
+            info = {"faces": mesh.face_count, "vertices": mesh.vertex_count}
+            path = os.path.join(directory, "model.mdl")
+            codec.write_model(path, mesh)
+            repeat = 3 if face_count >= 100000 else None
+
+            benchmarks.run("blender/model/import/{}".format(face_count), lambda: import_model(model, path), repeat=repeat, **info)
+
+            import_model(model, path)
+            export_path = os.path.join(directory, "export.mdl")
+            benchmarks.run("blender/model/export/{}".format(face_count), lambda: model.Export(context, export_path), repeat=repeat, **info)
+            benchmarks.run("blender/model/export_optimized/{}".format(face_count), lambda: model.Export(context, export_path, optimize_mesh=True), repeat=repeat, **info)
+
+        for bone_count in BLENDER_RIG_SIZES:
+            model_path = os.path.join(directory, "rigged.mdl")
+            rig_path = os.path.join(directory, "model.rig")
+            codec.write_model(model_path, synthetic.make_mesh(10000, label_count=bone_count))
+            codec.write_rig(rig_path, synthetic.make_rig(bone_count))
+
+            target = {}
+
+            def setup_rig():
+                target["obj"] = import_model(model, model_path)
+
+            benchmarks.run("blender/rig/import/{}".format(bone_count), lambda: rig.Import(context, rig_path, obj_name=target["obj"].name), setup=setup_rig, bones=bone_count)
+
+            setup_rig()
+            rig.Import(context, rig_path, obj_name=target["obj"].name)
+            armature_obj = target["obj"].find_armature()
+            context.view_layer.objects.active = armature_obj
+
+            export_path = os.path.join(directory, "export.rig")
+            benchmarks.run("blender/rig/export/{}".format(bone_count), lambda: rig.Export(context, export_path, 'BINARY'), bones=bone_count)
+
+            for frame_count in (100, 1000):
+                create_action(armature_obj, "bench", frame_count)
+                anim_path = os.path.join(directory, "export.anim")
+                benchmarks.run("blender/animation/export/{}x{}".format(bone_count, frame_count), lambda: animation.Export(context, anim_path, "bench"), repeat=3, bones=bone_count, frames=frame_count)
+                benchmarks.run("blender/animation/export_reduced/{}x{}".format(bone_count, frame_count), lambda: animation.Export(context, anim_path, "bench", tolerance=1.0), repeat=3, bones=bone_count, frames=frame_count)
+    finally:
+        clear_scene()
+        addon.unregister()
+
+# Keys a rotation and a location curve of every bone on every other frame.
+def create_action(armature_obj, name, frame_count, seed=0):
+    random = np.random.default_rng(seed)
+
+    action = bpy.data.actions.get(name)
+    if action:
+        bpy.data.actions.remove(action)
+
+    action = bpy.data.actions.new(name)
+    armature_obj.animation_data_create().action = action
+
+    times = np.arange(0, frame_count, 2, dtype=np.float32)
+
+    for bone in armature_obj.pose.bones:
+        bone.rotation_mode = 'XYZ'
+        for path, scale in (("rotation_euler", 1.0), ("location", 10.0)):
+            for axis in range(3):
+                fcurve = action.fcurves.new('pose.bones["{}"].{}'.format(bone.name, path), index=axis, action_group=bone.name)
+                fcurve.keyframe_points.add(len(times))
+                co = np.empty((len(times), 2), dtype=np.float32)
+                co[:, 0] = times
+                co[:, 1] = np.cumsum(random.normal(0, 0.05, len(times))) * scale
+                fcurve.keyframe_points.foreach_set("co", co.ravel())
+                fcurve.update()
+
+    return action
+
+def compare(results, baseline, threshold):
+    regressions = []
+
+    for name, result in sorted(results.items()):
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        ratio = result["min"] / previous["min"] if previous["min"] > 0 else 1.0
+        marker = ""
+        if ratio > 1.0 + threshold:
+            regressions.append(name)
+            marker = "  REGRESSION"
+        print("{:<48} {:>7.2f}x{}".format(name, ratio, marker))
+
+    return regressions
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Rune Synergy addon benchmarks")
+    parser.add_argument("--output", help="JSON file the results are written to")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="relative slowdown reported as a regression")
+    parser.add_argument("--repeat", type=int, default=5, help="repeats of every benchmark")
+    parser.add_argument("--only", nargs="*", help="only run benchmarks whose name contains one of these")
+    args = parser.parse_args(argv)
+
+    benchmarks = Benchmarks(args.repeat, args.only)
+    directory = tempfile.mkdtemp(prefix="rs_bench_")
+
+    try:
+        run_codec_benchmarks(benchmarks, directory)
+        if bpy is not None:
+            run_blender_benchmarks(benchmarks, directory)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "blender": bpy.app.version_string if bpy is not None else None,
+        },
+        "results": benchmarks.results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=1)
+
+    if args.baseline:
+        with open(args.baseline, "r") as file:
+            baseline = json.load(file)["results"]
+        regressions = compare(benchmarks.results, baseline, args.threshold)
+        if regressions:
+            print("{} regressions over {:.0%}".format(len(regressions), args.threshold))
+            return 1
+
+    return 0
+
+if __name__ == "__main__":
+    # blender passes its own arguments, ours follow a "--"
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+    sys.exit(main(argv))
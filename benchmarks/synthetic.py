@@ -0,0 +1,105 @@
+# Seeded generators of synthetic models, rigs and animations for the
+# benchmarks. Everything here is built on the addon's bpy-free data module.
+
+import os
+import sys
+import importlib
+import importlib.util
+import numpy as np
+
+ADDON_NAME = "rune_synergy"
+ADDON_PATH = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+ALPHAS = (0, 64, 128, 192)
+
+# Loads the addon from this checkout under ADDON_NAME, independent of what
+# is installed in blender.
+def load_addon():
+    addon = sys.modules.get(ADDON_NAME)
+    if addon is None:
+        spec = importlib.util.spec_from_file_location(
+            ADDON_NAME,
+            os.path.join(ADDON_PATH, "__init__.py"),
+            submodule_search_locations=[ADDON_PATH],
+        )
+        addon = importlib.util.module_from_spec(spec)
+        sys.modules[ADDON_NAME] = addon
+        spec.loader.exec_module(addon)
+    return addon
+
+def load_module(name):
+    load_addon()
+    return importlib.import_module("{}.{}".format(ADDON_NAME, name))
+
+# A grid of quads split into triangles, at least face_count faces. Vertices
+# are labeled in bands along x so every label owns a connected patch, and
+# faces get one of a few alpha groups in bands along z.
+def make_mesh(face_count, label_count=32, seed=0):
+    data = load_module("data")
+    random = np.random.default_rng(seed)
+
+    side = max(1, int(np.ceil(np.sqrt(face_count / 2))))
+    x, z = np.meshgrid(np.arange(side + 1), np.arange(side + 1), indexing="ij")
+    height = random.integers(-4, 5, size=x.shape)
+    vertices = np.stack((x.ravel() * 8, height.ravel(), z.ravel() * 8), axis=1)
+    vertex_label = x.ravel() * label_count // (side + 1)
+
+    corner = (np.arange(side)[:, None] * (side + 1) + np.arange(side)[None, :]).ravel()
+    faces = np.concatenate((
+        np.stack((corner, corner + side + 1, corner + side + 2), axis=1),
+        np.stack((corner, corner + side + 2, corner + 1), axis=1),
+    ))
+    face_band = np.concatenate((corner % (side + 1), corner % (side + 1))) * len(ALPHAS) // side
+
+    count = len(faces)
+
+    return data.Mesh(
+        vertices=vertices,
+        vertex_label=vertex_label,
+        faces=faces,
+        face_type=random.integers(0, 2, size=count),
+        face_color=random.integers(0, 128 * 512, size=count),
+        face_alpha=np.array(ALPHAS)[np.minimum(face_band, len(ALPHAS) - 1)],
+        face_label=np.minimum(face_band, len(ALPHAS) - 1),
+        face_layer=np.zeros(count, dtype=np.int32),
+    )
+
+# A tree of bone_count bones, each with branching children. Bone i is
+# placed by and transforms vertex label i.
+def make_rig(bone_count, branching=3):
+    data = load_module("data")
+
+    names = ["ROOT"] + ["bone_{}".format(index) for index in range(1, bone_count)]
+    parents = [None] + [names[(index - 1) // branching] for index in range(1, bone_count)]
+
+    return data.Rig(
+        names=names,
+        parents=parents,
+        origin_labels=[[index] for index in range(bone_count)],
+        labels=[[index] for index in range(bone_count)],
+    )
+
+# An archive of animation_count animations over bone_count bones. Every
+# animation has its own frame_count poses.
+def make_animation(bone_count, frame_count, animation_count=4, seed=0):
+    data = load_module("data")
+    random = np.random.default_rng(seed)
+
+    bones = ["bone_{}".format(index) for index in range(bone_count)]
+    total = frame_count * animation_count
+    field_count = len(data.TRANSFORM_FIELDS)
+
+    frames = data.AnimationFrames(
+        bones=bones,
+        transforms=random.integers(-1024, 1024, size=(total, bone_count, field_count, 3)),
+        present=random.random((total, bone_count, field_count)) < 0.5,
+    )
+
+    animations = {}
+    for index in range(animation_count):
+        ids = np.arange(index * frame_count, (index + 1) * frame_count)
+        animations["animation_{}".format(index)] = data.Animation(
+            frames=np.stack((ids, ids, np.full(frame_count, 2)), axis=1),
+        )
+
+    return data.AnimationArchive(animations=animations, frames=frames)
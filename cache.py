@@ -0,0 +1,93 @@
+import os
+import hashlib
+import zipfile
+import threading
+import numpy as np
+
+# bump whenever the arrays produced by model.import_arrays change layout
+CACHE_VERSION = 1
+
+MAX_SIZE = 512 * 1024 * 1024
+
+def content_key(data, version):
+    digest = hashlib.sha256()
+    digest.update("{}/{}:".format(version, CACHE_VERSION).encode("utf-8"))
+    digest.update(data)
+    return digest.hexdigest()
+
+# Decoded, blender ready import arrays stored as .npz files keyed by content
+# hash. Entries are touched on every hit and the least recently used ones are
+# evicted once the directory grows past max_size.
+class ArrayCache:
+    __slots__ = ("directory", "max_size")
+
+    def __init__(self, directory, max_size=MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".npz")
+
+    def load(self, key):
+        path = self.path(key)
+
+        try:
+            with np.load(path, allow_pickle=False) as file:
+                arrays = {name: file[name] for name in file.files}
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, EOFError, KeyError, zipfile.BadZipFile) as error:
+            # truncated or corrupt, drop it so it is decoded and stored again
+            print("Dropping broken cache entry", path, error)
+            self.remove(key)
+            return None
+
+        return arrays
+
+    def remove(self, key):
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def store(self, key, arrays):
+        os.makedirs(self.directory, exist_ok=True)
+
+        path = self.path(key)
+        temp_path = "{}.{}.{}.tmp".format(path, os.getpid(), threading.get_ident())
+
+        try:
+            with open(temp_path, "wb") as file:
+                np.savez(file, **arrays)
+            os.replace(temp_path, path)
+        except OSError as error:
+            print("Unable to cache import:", error)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+
+        self.trim()
+
+    def trim(self):
+        entries = []
+
+        with os.scandir(self.directory) as iterator:
+            for entry in iterator:
+                if entry.name.endswith(".npz"):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
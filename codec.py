@@ -0,0 +1,119 @@
+import json
+
+from . import proto, data
+
+def detect_mode(buffer):
+    # JSON is a top level object or array. Binary messages start with a field
+    # tag, and the only one of ours that is also JSON whitespace is 0x0a, '\n'.
+    if buffer.lstrip(b" \t\r\n")[:1] not in (b"{", b"["):
+        return 'BINARY'
+    if buffer[:1] != b"\n":
+        return 'JSON'
+
+    # a first field 1 whose length happens to be '{' or whitespace looks the
+    # same, only a parse tells them apart
+    try:
+        json.loads(buffer)
+    except ValueError:
+        return 'BINARY'
+    return 'JSON'
+
+# Every JSON encoding has an object at the top level, anything else would
+# fail further in with errors import doesn't expect from a bad file.
+def load_json(buffer):
+    value = json.loads(buffer)
+    if not isinstance(value, dict):
+        raise ValueError("expected a JSON object, found {}".format(type(value).__name__))
+    return value
+
+def decode_model(buffer, mode='AUTO'):
+    if mode == 'AUTO':
+        mode = detect_mode(buffer)
+
+    if mode == 'JSON':
+        mesh = data.Mesh.from_dict(load_json(buffer))
+    else:
+        mesh = data.Mesh.from_dict(proto.decode_mesh(buffer))
+
+    # a corrupt file fails here, not halfway through building the mesh
+    mesh.validate()
+    return mesh
+
+def encode_model(mesh, mode='BINARY'):
+    if mode == 'JSON':
+        return json.dumps(mesh.to_dict()).encode("utf-8")
+
+    return proto.encode_mesh(mesh.expand_double_sided())
+
+def read_model(filepath, mode='AUTO'):
+    with open(filepath, "rb") as file:
+        buffer = file.read()
+    return decode_model(buffer, mode)
+
+def write_model(filepath, mesh, mode='BINARY'):
+    buffer = encode_model(mesh, mode)
+    with open(filepath, "wb") as file:
+        file.write(buffer)
+
+def decode_rig(buffer, mode='AUTO'):
+    if mode == 'AUTO':
+        mode = detect_mode(buffer)
+
+    if mode == 'JSON':
+        return data.Rig.from_dict(load_json(buffer))
+
+    return data.Rig.from_dict(proto.decode("Rig", buffer))
+
+def encode_rig(rig, mode='BINARY'):
+    if mode == 'JSON':
+        return json.dumps(rig.to_dict()).encode("utf-8")
+
+    return proto.encode("Rig", rig.to_dict())
+
+def read_rig(filepath, mode='AUTO'):
+    with open(filepath, "rb") as file:
+        buffer = file.read()
+    return decode_rig(buffer, mode)
+
+def write_rig(filepath, rig, mode='BINARY'):
+    buffer = encode_rig(rig, mode)
+    with open(filepath, "wb") as file:
+        file.write(buffer)
+
+def decode_animation(buffer, mode='AUTO'):
+    if mode == 'AUTO':
+        mode = detect_mode(buffer)
+
+    if mode == 'JSON':
+        return data.AnimationArchive.from_dict(load_json(buffer))
+
+    tables = proto.decode_animation_tables(buffer)
+
+    if tables is None:
+        return data.AnimationArchive.from_dict(proto.decode("AnimationArchive", buffer))
+
+    message, frames = tables
+    return data.AnimationArchive(
+        animations=data.AnimationArchive.from_dict(message).animations,
+        frames=data.AnimationFrames(**frames),
+    )
+
+def encode_animation(archive, mode='BINARY'):
+    if mode == 'JSON':
+        return json.dumps(archive.to_dict()).encode("utf-8")
+
+    # names outside of ASCII take the generic encoder
+    buffer = proto.encode_animation(archive)
+    if buffer is None:
+        buffer = proto.encode("AnimationArchive", archive.to_dict())
+    return buffer
+
+def read_animation(filepath, mode='AUTO'):
+    with open(filepath, "rb") as file:
+        buffer = file.read()
+    return decode_animation(buffer, mode)
+
+def write_animation(filepath, archive, mode='BINARY'):
+    buffer = encode_animation(archive, mode)
+    with open(filepath, "wb") as file:
+        file.write(buffer)
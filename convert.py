@@ -0,0 +1,162 @@
+# Converts trees of .mdl and .rig files between the JSON and binary encodings
+# without blender, e.g.
+#
+#   python -m rune_synergy.convert legacy/ converted/ --to BINARY
+#
+# Outputs mirror the layout of the source tree. Files whose output is newer
+# than the source and already in the target encoding are skipped, and outputs
+# whose bytes would not change are left untouched so their mtime stays put.
+# Conversions that would lose data, like the root flags of legacy bone rigs,
+# fail instead.
+
+import os
+import sys
+import time
+import argparse
+
+from concurrent.futures import ProcessPoolExecutor
+
+from . import codec, data, util
+
+CODECS = {
+    ".mdl": (codec.decode_model, codec.encode_model),
+    ".rig": (codec.decode_rig, codec.encode_rig),
+}
+
+class Result:
+    __slots__ = ("source", "status", "size", "seconds", "error")
+
+    def __init__(self, source, status, size=0, seconds=0.0, error=None):
+        self.source = source
+        self.status = status
+        self.size = size
+        self.seconds = seconds
+        self.error = error
+
+def is_convertible(filename):
+    return os.path.splitext(filename)[1] in CODECS
+
+def find_files(source):
+    if os.path.isfile(source):
+        if is_convertible(source):
+            yield os.path.basename(source)
+        return
+
+    for directory, _, filenames in os.walk(source):
+        for filename in sorted(filenames):
+            if is_convertible(filename):
+                yield os.path.relpath(os.path.join(directory, filename), source)
+
+# The output is newer than the source and already in the target encoding, an
+# earlier run with another --to doesn't count.
+def is_up_to_date(source, destination, mode):
+    try:
+        if os.stat(destination).st_mtime < os.stat(source).st_mtime:
+            return False
+        with open(destination, "rb") as file:
+            return codec.detect_mode(file.read()) == mode
+    except OSError:
+        return False
+
+# Only legacy bone rigs carry root flags, the vertex group layout both
+# encodings are written in has nowhere to keep them.
+def check_lossless(value):
+    if isinstance(value, data.Rig) and value.root.any():
+        raise ValueError("legacy rig has root bones, which the converted rig can't keep")
+
+# Runs in the worker processes, so everything it needs is passed in and
+# everything it returns is picklable.
+def convert_file(task):
+    source, destination, mode, force = task
+
+    if not force and is_up_to_date(source, destination, mode):
+        return Result(source, "skipped")
+
+    start = time.perf_counter()
+
+    try:
+        with open(source, "rb") as file:
+            buffer = file.read()
+
+        # already in the target encoding, copied over as is
+        if codec.detect_mode(buffer) != mode:
+            decode, encode = CODECS[os.path.splitext(source)[1]]
+            value = decode(buffer)
+            check_lossless(value)
+            buffer = encode(value, mode)
+
+        changed = util.write_if_changed(destination, buffer)
+    except Exception as error:
+        # a malformed asset fails on its own, not the whole conversion
+        return Result(source, "failed", error="{}: {}".format(type(error).__name__, error))
+
+    return Result(source, "converted" if changed else "unchanged", len(buffer), time.perf_counter() - start)
+
+def format_rate(size, seconds):
+    if seconds <= 0:
+        return "-"
+    return "{:.1f} MB/s".format(size / seconds / (1024 * 1024))
+
+def convert(source, destination, mode='BINARY', jobs=None, force=False, verbose=True):
+    tasks = [
+        (os.path.join(source, path) if os.path.isdir(source) else source, os.path.join(destination, path), mode, force)
+        for path in find_files(source)
+    ]
+
+    counts = {"converted": 0, "unchanged": 0, "skipped": 0, "failed": 0}
+    total_size = 0
+    start = time.perf_counter()
+
+    # many small files, so hand them to the workers in batches
+    chunksize = max(1, len(tasks) // ((jobs or os.cpu_count() or 1) * 16))
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for result in executor.map(convert_file, tasks, chunksize=chunksize):
+            counts[result.status] += 1
+            total_size += result.size
+
+            if result.status == "failed":
+                print("{}: failed: {}".format(result.source, result.error), file=sys.stderr)
+            elif verbose and result.status != "skipped":
+                print("{}: {} {} bytes in {:.2f} ms, {}".format(
+                    result.source,
+                    result.status,
+                    result.size,
+                    result.seconds * 1000,
+                    format_rate(result.size, result.seconds),
+                ))
+
+    seconds = time.perf_counter() - start
+
+    print("{} files in {:.2f} s ({:.0f} files/s, {}): {converted} converted, {unchanged} unchanged, {skipped} skipped, {failed} failed".format(
+        len(tasks),
+        seconds,
+        len(tasks) / seconds if seconds > 0 else 0,
+        format_rate(total_size, seconds),
+        **counts,
+    ))
+
+    return counts
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert Rune Synergy .mdl and .rig files between JSON and binary")
+    parser.add_argument("source", help="file or directory to convert")
+    parser.add_argument("destination", help="directory the converted files are written to")
+    parser.add_argument("--to", dest="mode", choices=("BINARY", "JSON"), type=str.upper, default="BINARY", help="target encoding")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes, defaults to the cpu count")
+    parser.add_argument("-f", "--force", action="store_true", help="convert files even if their output is newer")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only print failures and the summary")
+    args = parser.parse_args(argv)
+
+    if os.path.abspath(args.source) == os.path.abspath(args.destination):
+        parser.error("destination must differ from the source")
+
+    if os.path.isfile(args.source) and not is_convertible(args.source):
+        parser.error("source must be a directory or one of {}".format(", ".join(sorted(CODECS))))
+
+    counts = convert(args.source, args.destination, args.mode, args.jobs, args.force, not args.quiet)
+
+    return 1 if counts["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
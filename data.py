@@ -0,0 +1,522 @@
+# Array backed models of the asset formats. Nothing in here depends on bpy,
+# so the codecs and conversions built on it also run outside of blender.
+
+import itertools
+import numpy as np
+
+from collections import deque
+
+def int_column(values, width=1):
+    column = np.asarray(values, dtype=np.int32)
+    if width > 1:
+        return column.reshape(-1, width)
+    return column.reshape(-1)
+
+def ragged(lists):
+    lengths = np.fromiter(map(len, lists), dtype=np.int32, count=len(lists))
+    offsets = np.zeros(len(lists) + 1, dtype=np.int32)
+    offsets[1:] = np.cumsum(lengths)
+    values = np.fromiter(itertools.chain.from_iterable(lists), dtype=np.int32, count=int(offsets[-1]))
+    return values, offsets
+
+class Mesh:
+    __slots__ = (
+        "vertices",
+        "vertex_label",
+        "faces",
+        "face_type",
+        "face_color",
+        "face_alpha",
+        "face_label",
+        "face_layer",
+        "face_double_sided",
+        "texture_faces",
+    )
+
+    def __init__(self, vertices=(), vertex_label=None, faces=(), face_type=None, face_color=None,
+            face_alpha=None, face_label=None, face_layer=None, face_double_sided=None, texture_faces=()):
+        self.vertices = int_column(vertices, 3)
+        self.faces = int_column(faces, 3)
+        self.texture_faces = int_column(texture_faces, 3)
+
+        vertex_count = len(self.vertices)
+        face_count = len(self.faces)
+
+        def per_element(values, count):
+            if values is None:
+                return np.zeros(count, dtype=np.int32)
+            return int_column(values)
+
+        self.vertex_label = per_element(vertex_label, vertex_count)
+        self.face_type = per_element(face_type, face_count)
+        self.face_color = per_element(face_color, face_count)
+        self.face_alpha = per_element(face_alpha, face_count)
+        self.face_label = per_element(face_label, face_count)
+        self.face_layer = per_element(face_layer, face_count)
+
+        if face_double_sided is None:
+            self.face_double_sided = np.zeros(face_count, dtype=bool)
+        else:
+            self.face_double_sided = np.asarray(face_double_sided, dtype=bool).reshape(-1)
+
+    @property
+    def vertex_count(self):
+        return len(self.vertices)
+
+    @property
+    def face_count(self):
+        return len(self.faces)
+
+    @classmethod
+    def from_dict(cls, model):
+        faces = model.get("faces", ())
+        columns = {
+            name: model.get(name)
+            for name in ("face_type", "face_color", "face_alpha", "face_label", "face_layer", "face_double_sided")
+        }
+
+        # the format only has triangles, polygons from legacy JSON become fans
+        if not isinstance(faces, np.ndarray) and any(len(face) != 3 for face in faces):
+            triangles = []
+            source = []
+            for index, face in enumerate(faces):
+                for corner in range(1, len(face) - 1):
+                    triangles.append((face[0], face[corner], face[corner + 1]))
+                    source.append(index)
+            faces = triangles
+            columns = {
+                name: None if values is None else np.asarray(values)[source]
+                for name, values in columns.items()
+            }
+
+        return cls(
+            vertices=model.get("vertices", ()),
+            vertex_label=model.get("vertex_label"),
+            faces=faces,
+            texture_faces=model.get("texture_faces", ()),
+            **columns,
+        )
+
+    def to_dict(self):
+        model = {
+            "vertices": self.vertices.tolist(),
+            "vertex_label": self.vertex_label.tolist(),
+            "faces": self.faces.tolist(),
+            "face_type": self.face_type.tolist(),
+            "face_color": self.face_color.tolist(),
+            "face_alpha": self.face_alpha.tolist(),
+            "face_label": self.face_label.tolist(),
+            "face_layer": self.face_layer.tolist(),
+            "texture_faces": self.texture_faces.tolist(),
+        }
+
+        if self.face_double_sided.any():
+            model["face_double_sided"] = self.face_double_sided.tolist()
+
+        return model
+
+    # The binary and pack formats have no double sided flag, such faces get a
+    # copy with reversed winding appended at the end instead.
+    def expand_double_sided(self):
+        double_sided = self.face_double_sided
+
+        if not double_sided.any():
+            return self
+
+        faces = np.concatenate((np.arange(self.face_count), np.flatnonzero(double_sided)))
+
+        return Mesh(
+            vertices=self.vertices,
+            vertex_label=self.vertex_label,
+            faces=np.concatenate((self.faces, self.faces[double_sided][:, ::-1])),
+            face_type=self.face_type[faces],
+            face_color=self.face_color[faces],
+            face_alpha=self.face_alpha[faces],
+            face_label=self.face_label[faces],
+            face_layer=self.face_layer[faces],
+            texture_faces=self.texture_faces,
+        )
+
+    def validate(self):
+        vertex_count = len(self.vertices)
+        face_count = len(self.faces)
+
+        if len(self.vertex_label) != vertex_count:
+            raise ValueError("{} vertex labels for {} vertices".format(len(self.vertex_label), vertex_count))
+
+        for name in ("face_type", "face_color", "face_alpha", "face_label", "face_layer", "face_double_sided"):
+            if len(getattr(self, name)) != face_count:
+                raise ValueError("{} {} values for {} faces".format(len(getattr(self, name)), name, face_count))
+
+        if face_count and (self.faces.min() < 0 or self.faces.max() >= vertex_count):
+            raise ValueError("face references a vertex outside of the {} vertices".format(vertex_count))
+
+class Rig:
+    __slots__ = (
+        "names",
+        "parents",
+        "inherit_scale",
+        "root",
+        "origin_labels",
+        "origin_offsets",
+        "labels",
+        "label_offsets",
+        "face_group_names",
+        "face_group_labels",
+        "face_group_offsets",
+    )
+
+    def __init__(self, names=(), parents=None, inherit_scale=None, root=None, origin_labels=(), labels=(), face_groups=()):
+        self.names = list(names)
+        self.parents = list(parents) if parents is not None else [None] * len(self.names)
+        self.inherit_scale = np.zeros(len(self.names), dtype=bool) if inherit_scale is None else np.asarray(inherit_scale, dtype=bool)
+        self.root = np.zeros(len(self.names), dtype=bool) if root is None else np.asarray(root, dtype=bool)
+        self.origin_labels, self.origin_offsets = ragged(list(origin_labels))
+        self.labels, self.label_offsets = ragged(list(labels))
+        self.face_group_names = [name for name, _ in face_groups]
+        self.face_group_labels, self.face_group_offsets = ragged([labels for _, labels in face_groups])
+
+    def __len__(self):
+        return len(self.names)
+
+    # Reads both the exported vertex group layout and the legacy bone layout
+    # with parent names, origins, rotates and root flags.
+    @classmethod
+    def from_dict(cls, data):
+        if "bones" in data:
+            bones = data["bones"]
+            return cls(
+                names=[bone["name"] for bone in bones],
+                parents=[bone.get("parent") or None for bone in bones],
+                root=[bone.get("root") == True for bone in bones],
+                origin_labels=[bone.get("origins", ()) for bone in bones],
+                labels=[bone.get("rotates", ()) for bone in bones],
+            )
+
+        groups = data.get("vertex_groups", ())
+        parents = {}
+        for group in groups:
+            for child in group.get("children", ()):
+                parents[child] = group["name"]
+
+        return cls(
+            names=[group["name"] for group in groups],
+            parents=[parents.get(group["name"]) for group in groups],
+            inherit_scale=[bool(group.get("inherit_scale")) for group in groups],
+            origin_labels=[group.get("origin_labels", ()) for group in groups],
+            labels=[group.get("labels", ()) for group in groups],
+            face_groups=[(group["name"], group.get("labels", ())) for group in data.get("face_groups", ())],
+        )
+
+    def to_dict(self):
+        children = self.get_children()
+        vertex_groups = []
+
+        for index, name in enumerate(self.names):
+            group = {
+                "name": name,
+                "origin_labels": self.get_origin_labels(index),
+                "labels": self.get_labels(index),
+                "children": children[name],
+            }
+            if self.inherit_scale[index]:
+                group["inherit_scale"] = True
+            vertex_groups.append(group)
+
+        face_groups = [
+            {
+                "name": name,
+                "labels": self.face_group_labels[self.face_group_offsets[index]:self.face_group_offsets[index + 1]].tolist(),
+            }
+            for index, name in enumerate(self.face_group_names)
+        ]
+
+        return {
+            "vertex_groups": vertex_groups,
+            "face_groups": face_groups,
+        }
+
+    def get_origin_labels(self, index):
+        return self.origin_labels[self.origin_offsets[index]:self.origin_offsets[index + 1]].tolist()
+
+    def get_labels(self, index):
+        return self.labels[self.label_offsets[index]:self.label_offsets[index + 1]].tolist()
+
+    def get_children(self):
+        children = {name: [] for name in self.names}
+        for name, parent in zip(self.names, self.parents):
+            if parent in children:
+                children[parent].append(name)
+        return children
+
+# Bone hierarchy of a rig, built once per import/export: parent -> children
+# adjacency by name, breadth first depth order, and a free bone id allocator.
+class RigTopology:
+    __slots__ = ("parents", "children", "used_ids", "next_id")
+
+    MAX_ID = 255
+
+    def __init__(self, parents):
+        self.parents = {}
+        self.children = {}
+        self.used_ids = set()
+        self.next_id = 0
+
+        for name, parent in parents:
+            self.parents[name] = parent
+            self.children[name] = []
+
+        for name, parent in self.parents.items():
+            if parent in self.children:
+                self.children[parent].append(name)
+
+    @classmethod
+    def from_bones(cls, bones):
+        return cls((bone.name, bone.parent.name if bone.parent else None) for bone in bones)
+
+    def roots(self):
+        return [name for name, parent in self.parents.items() if parent not in self.children]
+
+    def depth_order(self):
+        order = []
+        queue = deque(self.roots())
+        while queue:
+            name = queue.popleft()
+            order.append(name)
+            queue.extend(self.children[name])
+        return order
+
+    def reserve_id(self, id):
+        self.used_ids.add(id)
+
+    def allocate_id(self):
+        while self.next_id in self.used_ids:
+            self.next_id += 1
+        if self.next_id >= self.MAX_ID:
+            return None
+        id = self.next_id
+        self.used_ids.add(id)
+        return id
+
+# Vertices grouped by their label: the vertex indices sorted by label, with
+# offsets into them for every distinct label, plus per label coordinate sums
+# so centroids of any set of labels don't need to touch the vertices again.
+class LabelIndex:
+    __slots__ = ("labels", "offsets", "vertices", "sums", "counts")
+
+    def __init__(self, vertex_labels, positions):
+        vertex_labels = np.asarray(vertex_labels, dtype=np.int32)
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+
+        self.vertices = np.argsort(vertex_labels, kind="stable").astype(np.int32)
+        self.labels, starts, self.counts = np.unique(vertex_labels[self.vertices], return_index=True, return_counts=True)
+        self.offsets = np.append(starts, len(self.vertices)).astype(np.int32)
+
+        slot = np.searchsorted(self.labels, vertex_labels)
+        self.sums = np.stack([
+            np.bincount(slot, weights=positions[:, axis], minlength=len(self.labels))
+            for axis in range(3)
+        ], axis=1)
+
+    def find(self, label):
+        slot = int(np.searchsorted(self.labels, label))
+        if slot < len(self.labels) and self.labels[slot] == label:
+            return slot
+        return -1
+
+    def __contains__(self, label):
+        return self.find(label) >= 0
+
+    def __iter__(self):
+        return iter(self.labels.tolist())
+
+    def get_vertices(self, labels):
+        slots = [slot for slot in map(self.find, dict.fromkeys(labels)) if slot >= 0]
+        if not slots:
+            return np.empty(0, dtype=np.int32)
+        return np.concatenate([self.vertices[self.offsets[slot]:self.offsets[slot + 1]] for slot in slots])
+
+    def get_centroid(self, labels):
+        slots = [slot for slot in map(self.find, labels) if slot >= 0]
+        count = self.counts[slots].sum()
+        if count == 0:
+            return np.zeros(3)
+        return self.sums[slots].sum(axis=0) / count
+
+TRANSFORM_FIELDS = ("rotate", "translate", "scale")
+
+# A table of animation poses. transforms is indexed by (frame, bone, field,
+# axis) with fields in TRANSFORM_FIELDS order, and present tells which of the
+# optional transform fields a frame sets for a bone.
+class AnimationFrames:
+    __slots__ = ("bones", "transforms", "present", "groups", "alphas", "alpha_present", "durations")
+
+    def __init__(self, bones=(), transforms=None, present=None, groups=(), alphas=None, alpha_present=None, durations=None):
+        self.bones = list(bones)
+        self.groups = list(groups)
+
+        if transforms is None:
+            transforms = np.zeros((0, len(self.bones), len(TRANSFORM_FIELDS), 3), dtype=np.int32)
+        self.transforms = np.asarray(transforms, dtype=np.int32)
+
+        count = len(self.transforms)
+
+        if present is None:
+            present = np.zeros((count, len(self.bones), len(TRANSFORM_FIELDS)), dtype=bool)
+        self.present = np.asarray(present, dtype=bool)
+
+        if alphas is None:
+            alphas = np.zeros((count, len(self.groups)), dtype=np.int32)
+        self.alphas = np.asarray(alphas, dtype=np.int32)
+
+        if alpha_present is None:
+            alpha_present = np.zeros((count, len(self.groups)), dtype=bool)
+        self.alpha_present = np.asarray(alpha_present, dtype=bool)
+
+        if durations is None:
+            durations = np.zeros(count, dtype=np.int32)
+        self.durations = np.asarray(durations, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.transforms)
+
+    # bytes identifying the content of a frame, for interning identical poses
+    def key(self, index):
+        return b"".join((
+            self.transforms[index].tobytes(),
+            self.present[index].tobytes(),
+            self.alphas[index].tobytes(),
+            self.alpha_present[index].tobytes(),
+            self.durations[index].tobytes(),
+        ))
+
+    def take(self, indices):
+        return AnimationFrames(
+            bones=self.bones,
+            transforms=self.transforms[indices],
+            present=self.present[indices],
+            groups=self.groups,
+            alphas=self.alphas[indices],
+            alpha_present=self.alpha_present[indices],
+            durations=self.durations[indices],
+        )
+
+    @classmethod
+    def from_dicts(cls, frames):
+        bones = sorted({bone for frame in frames for bone in frame.get("transforms", {})})
+        groups = sorted({group for frame in frames for group in frame.get("alphas", {})})
+        bone_index = {bone: index for index, bone in enumerate(bones)}
+        group_index = {group: index for index, group in enumerate(groups)}
+
+        table = cls(bones=bones, groups=groups, transforms=np.zeros((len(frames), len(bones), len(TRANSFORM_FIELDS), 3), dtype=np.int32))
+
+        for index, frame in enumerate(frames):
+            for bone, transform in frame.get("transforms", {}).items():
+                for field_index, field in enumerate(TRANSFORM_FIELDS):
+                    vector = transform.get(field)
+                    if vector is None:
+                        continue
+                    table.present[index, bone_index[bone], field_index] = True
+                    table.transforms[index, bone_index[bone], field_index] = (vector.get("x", 0), vector.get("y", 0), vector.get("z", 0))
+            for group, alpha in frame.get("alphas", {}).items():
+                table.alpha_present[index, group_index[group]] = True
+                table.alphas[index, group_index[group]] = alpha
+            table.durations[index] = frame.get("duration", 0)
+
+        return table
+
+    def to_dicts(self):
+        frames = []
+        transforms = self.transforms.tolist()
+        present = self.present.tolist()
+        alphas = self.alphas.tolist()
+        alpha_present = self.alpha_present.tolist()
+
+        for index in range(len(self)):
+            frame_transforms = {}
+            for bone_index, bone in enumerate(self.bones):
+                fields = present[index][bone_index]
+                if not any(fields):
+                    continue
+                frame_transforms[bone] = {
+                    field: dict(zip("xyz", transforms[index][bone_index][field_index]))
+                    for field_index, field in enumerate(TRANSFORM_FIELDS)
+                    if fields[field_index]
+                }
+            frames.append({
+                "transforms": frame_transforms,
+                "alphas": {
+                    group: alphas[index][group_index]
+                    for group_index, group in enumerate(self.groups)
+                    if alpha_present[index][group_index]
+                },
+                "duration": int(self.durations[index]),
+            })
+
+        return frames
+
+# An animation is a list of (primary frame id, secondary frame id, duration)
+# references into the frame table of its archive.
+class Animation:
+    __slots__ = ("frames", "skip_bases", "loop", "overrides", "priority", "stretch")
+
+    def __init__(self, frames=(), skip_bases=(), loop=None, overrides=None, priority=0, stretch=False):
+        self.frames = int_column(frames, 3)
+        self.skip_bases = int_column(skip_bases)
+        self.loop = loop
+        self.overrides = overrides
+        self.priority = priority
+        self.stretch = stretch
+
+    @classmethod
+    def from_dict(cls, animation):
+        return cls(
+            frames=[
+                (ref.get("primary_frame_id", 0), ref.get("secondary_frame_id", 0), ref.get("duration", 0))
+                for ref in animation.get("frames", ())
+            ],
+            skip_bases=animation.get("skip_bases", ()),
+            loop=animation.get("loop"),
+            overrides=animation.get("overrides"),
+            priority=animation.get("priority", 0),
+            stretch=animation.get("stretch", False),
+        )
+
+    def to_dict(self):
+        animation = {
+            "frames": [
+                {"primary_frame_id": primary, "secondary_frame_id": secondary, "duration": duration}
+                for primary, secondary, duration in self.frames.tolist()
+            ],
+        }
+        if len(self.skip_bases):
+            animation["skip_bases"] = self.skip_bases.tolist()
+        if self.loop is not None:
+            animation["loop"] = self.loop
+        if self.overrides is not None:
+            animation["overrides"] = self.overrides
+        if self.priority:
+            animation["priority"] = self.priority
+        if self.stretch:
+            animation["stretch"] = True
+        return animation
+
+class AnimationArchive:
+    __slots__ = ("animations", "frames")
+
+    def __init__(self, animations=None, frames=None):
+        self.animations = animations if animations is not None else {}
+        self.frames = frames if frames is not None else AnimationFrames()
+
+    @classmethod
+    def from_dict(cls, archive):
+        return cls(
+            animations={name: Animation.from_dict(animation) for name, animation in archive.get("animations", {}).items()},
+            frames=AnimationFrames.from_dicts(archive.get("frames", ())),
+        )
+
+    def to_dict(self):
+        return {
+            "animations": {name: animation.to_dict() for name, animation in self.animations.items()},
+            "frames": self.frames.to_dicts(),
+        }
@@ -1,108 +1,360 @@
 import os
 import bpy
-import bmesh
-import json
-import math
+import hashlib
+import numpy as np
 
-from mathutils import Vector
-from bpy.types import Operator, Panel, UIList, PropertyGroup
-from bpy.props import StringProperty, FloatProperty, BoolProperty
+from concurrent.futures import ThreadPoolExecutor
+from bpy.types import Operator, Panel, UIList
+from bpy.props import StringProperty, FloatProperty, BoolProperty, EnumProperty, CollectionProperty
 from bpy_extras.io_utils import ImportHelper, ExportHelper
 
-from . import util
+from . import bl_info, util, data, codec, cache, pack, optimize, patch, profiling, background
 
-def Import(context, filepath):
-    data = None
+ADDON_VERSION = ".".join(map(str, bl_info["version"]))
 
-    with open(filepath, "r") as file:
-        data = json.load(file)
+# shared by the exporters and the watch settings
+OPTIMIZE_MESH = BoolProperty(
+    name="Optimize",
+    description="Weld identical vertices, drop degenerate and duplicate faces, and reorder faces for the vertex cache",
+    default=False,
+)
 
-    if data is None:
-        print("No model data to import")
+def Import(context, filepath, mode='AUTO'):
+    return ImportFiles(context, [filepath], mode)
+
+def ImportFiles(context, filepaths, mode='AUTO', use_cache=True, reuse_meshes=True):
+    imported = 0
+
+    array_cache = get_cache() if use_cache else None
+
+    # meshes already imported this session, by the hash of the file they came from
+    meshes = {}
+    if reuse_meshes:
+        meshes = {mesh.import_hash: mesh for mesh in bpy.data.meshes if mesh.import_hash}
+    known = frozenset(meshes)
+
+    # meshes known to still hold what was imported into them
+    unedited = set()
+
+    # decoding doesn't touch blender data, so files are parsed in the pool while
+    # the main thread builds the meshes of the ones that are already done
+    with ThreadPoolExecutor(max_workers=min(len(filepaths), os.cpu_count() or 1) or 1) as executor:
+        futures = [executor.submit(decode_file, filepath, mode, array_cache, known) for filepath in filepaths]
+
+        for filepath, future in zip(filepaths, futures):
+            try:
+                key, arrays = future.result()
+            except (OSError, ValueError) as error:
+                print("Unable to decode model", filepath, error)
+                continue
+
+            mesh = meshes.get(key)
+
+            if mesh and key not in unedited:
+                if mesh.import_geometry == geometry_hash(mesh):
+                    unedited.add(key)
+                else:
+                    # edited since, it no longer holds the contents of the file
+                    mesh.import_hash = ""
+                    del meshes[key]
+                    mesh = None
+                    if arrays is None:
+                        key, arrays = decode_file(filepath, mode, array_cache)
+
+            if mesh:
+                link_object(context, util.filename_without_extension(filepath), mesh)
+            else:
+                obj = create_object(context, filepath, arrays)
+                obj.data.import_hash = key
+                obj.data.import_geometry = geometry_hash(obj.data)
+                if reuse_meshes:
+                    meshes[key] = obj.data
+                    unedited.add(key)
+
+            imported += 1
+
+    if imported == 0:
         return {'CANCELLED'}
 
-    name = util.filename_without_extension(filepath)
-
-    mesh = bpy.data.meshes.new(name)
-    mesh.import_path = filepath
+    return {'FINISHED'}
 
+def get_cache():
+    return cache.ArrayCache(bpy.utils.user_resource('DATAFILES', path=os.path.join("rune_synergy", "import_cache")))
+
+# Returns the content key of the file and its import arrays, or None for the
+# arrays when the key is in known and the file doesn't need decoding at all.
+def decode_file(filepath, mode='AUTO', array_cache=None, known=()):
+    with profiling.span("read"):
+        with open(filepath, "rb") as file:
+            buffer = file.read()
+
+    key = cache.content_key(buffer, ADDON_VERSION)
+
+    if key in known:
+        return key, None
+
+    with profiling.span("cache load"):
+        arrays = array_cache.load(key) if array_cache else None
+
+    if arrays is None:
+        with profiling.span("decode"):
+            model = codec.decode_model(buffer, mode)
+        with profiling.span("convert"):
+            arrays = import_arrays(model)
+        if array_cache:
+            with profiling.span("cache store"):
+                array_cache.store(key, arrays)
+
+    return key, arrays
+
+# Hash of everything an import writes into a mesh, to tell whether the mesh
+# was edited since.
+def geometry_hash(mesh):
+    digest = hashlib.sha256()
+
+    for collection, attribute, dtype, width in (
+        (mesh.vertices, "co", np.float32, 3),
+        (mesh.loops, "vertex_index", np.int32, 1),
+        (mesh.polygons, "material_index", np.int32, 1),
+        (mesh.polygons, "use_smooth", bool, 1),
+    ):
+        values = np.empty(len(collection) * width, dtype=dtype)
+        collection.foreach_get(attribute, values)
+        digest.update(values.tobytes())
+
+    label_layer = mesh.attributes.get("label")
+    if label_layer:
+        values = np.empty(len(label_layer.data), dtype=np.int32)
+        label_layer.data.foreach_get("value", values)
+        digest.update(values.tobytes())
+
+    uv_layer = mesh.uv_layers.get("color")
+    if uv_layer:
+        values = np.empty(len(uv_layer.data) * 2, dtype=np.float32)
+        uv_layer.data.foreach_get("uv", values)
+        digest.update(values.tobytes())
+
+    return digest.hexdigest()
+
+def link_object(context, name, mesh):
     obj = bpy.data.objects.new(name, mesh)
     context.collection.objects.link(obj)
     context.view_layer.objects.active = obj
+    return obj
 
-    bm = bmesh.new()
-    
-    label_layer = bm.verts.layers.int.new("label")
-    
-    for index, vertex in enumerate(data["vertices"]):
-        x = vertex[0]
-        y = vertex[2]
-        z = -vertex[1]
-        
-        v = bm.verts.new((x,y,z))
-        v[label_layer] = data["vertex_label"][index]        
-    bm.verts.ensure_lookup_table()
+def create_object(context, filepath, arrays, name=None):
+    name = name or util.filename_without_extension(filepath)
 
-    uv_layer = bm.loops.layers.uv.get("color")
+    mesh = bpy.data.meshes.new(name)
+    mesh.import_path = filepath
 
-    if not uv_layer:
-        uv_layer = bm.loops.layers.uv.new("color")
+    obj = link_object(context, name, mesh)
 
-    materials = {}
-    
-    for index, face in enumerate(data["faces"]):
-        type = data["face_type"][index]
-        color = data["face_color"][index]
-        alpha = data["face_alpha"][index]
-        double_sided = data["face_double_sided"][index]
-                
-        u = ((color % 128.0) + 0.5) / 128.0
-        v = ((color / 128.0)) / 512.0
-        v = 1.0 - v
-        
-        f = bm.faces.new([bm.verts[i] for i in face])
-        f.smooth = type & 1 == 0
-        
-        for loop in f.loops:
-            loop[uv_layer].uv = (u, v)
+    # one material per (alpha, double sided) facegroup, the slot is looked up once per group
+    with profiling.span("materials"):
+        slot_index = np.empty(len(arrays["facegroup_alpha"]), dtype=np.int32)
+
+        for group, (alpha, double_sided) in enumerate(zip(arrays["facegroup_alpha"].tolist(), arrays["facegroup_double_sided"].tolist())):
+            facegroup = "{}".format(alpha)
+            if double_sided:
+                facegroup += "_DS"
 
-        facegroup = "{}".format(alpha)
-        if double_sided:
-            facegroup += "_DS"
-        material = materials.get(facegroup)
-        
-        if not material:
             material = create_facegroup(obj, facegroup, alpha)
             if double_sided:
                 material.double_sided = True
-            materials[facegroup] = material
 
-        material_index = obj.material_slots.find(material.name)
-        f.material_index = material_index
-        
-    bm.faces.ensure_lookup_table()
-    bm.faces.index_update()
-            
-    bm.to_mesh(mesh)
-    bm.free()
+            slot_index[group] = obj.material_slots.find(material.name)
+
+        material_index = slot_index[arrays["face_facegroup"]]
+
+    with profiling.span("build mesh"):
+        build_mesh(mesh, arrays, material_index)
+
+    return obj
+
+def import_arrays(mesh):
+    face_count = mesh.face_count
+
+    # the model is Y down and Z forward, blender is Z up and -Y forward
+    vertices = mesh.vertices.astype(np.float32)
+    positions = np.empty_like(vertices)
+    positions[:, 0] = vertices[:, 0]
+    positions[:, 1] = vertices[:, 2]
+    positions[:, 2] = -vertices[:, 1]
+
+    loop_total = np.full(face_count, 3, dtype=np.int32)
+    loop_vertex = mesh.faces.astype(np.int32).ravel()
+    loop_start = np.arange(0, face_count * 3, 3, dtype=np.int32)
+
+    # every loop of a face samples the same palette texel
+    color = mesh.face_color.astype(np.float64)
+    face_uv = np.empty((face_count, 2), dtype=np.float32)
+    face_uv[:, 0] = ((color % 128.0) + 0.5) / 128.0
+    face_uv[:, 1] = 1.0 - (color / 128.0) / 512.0
+
+    face_alpha = mesh.face_alpha
+    face_double_sided = mesh.face_double_sided
+
+    # unique (alpha, double sided) pairs, numbered in order of first appearance
+    facegroup_key = face_alpha.astype(np.int64) * 2 + face_double_sided
+    _, first_face, inverse = np.unique(facegroup_key, return_index=True, return_inverse=True)
+    order = np.argsort(first_face)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    first_face = first_face[order]
+
+    return {
+        "positions": positions,
+        "labels": mesh.vertex_label.astype(np.int32),
+        "loop_vertex": loop_vertex,
+        "loop_start": loop_start,
+        "loop_total": loop_total,
+        "loop_uv": np.repeat(face_uv, loop_total, axis=0),
+        "smooth": (mesh.face_type & 1) == 0,
+        "face_facegroup": rank[inverse.ravel()].astype(np.int32),
+        "facegroup_alpha": face_alpha[first_face],
+        "facegroup_double_sided": face_double_sided[first_face],
+    }
+
+def build_mesh(mesh, arrays, material_index):
+    positions = arrays["positions"]
+    loop_vertex = arrays["loop_vertex"]
+    loop_start = arrays["loop_start"]
+
+    mesh.vertices.add(len(positions))
+    mesh.vertices.foreach_set("co", positions.ravel())
 
-    mesh.update()
+    mesh.loops.add(len(loop_vertex))
+    mesh.loops.foreach_set("vertex_index", loop_vertex)
+
+    mesh.polygons.add(len(loop_start))
+    mesh.polygons.foreach_set("loop_start", loop_start)
+    mesh.polygons.foreach_set("loop_total", arrays["loop_total"])
+    mesh.polygons.foreach_set("use_smooth", arrays["smooth"])
+    mesh.polygons.foreach_set("material_index", material_index)
+
+    label_layer = mesh.attributes.new("label", 'INT', 'POINT')
+    label_layer.data.foreach_set("value", arrays["labels"])
+
+    uv_layer = mesh.uv_layers.new(name="color")
+    uv_layer.data.foreach_set("uv", arrays["loop_uv"].ravel())
+
+    # validated before the update, which would trip over bad indices first
+    mesh.validate(clean_customdata=False)
+    mesh.update(calc_edges=True)
+
+def Export(context, filepath, mode='BINARY', optimize_mesh=False, write_patch=False):
+    snapshot = export_active_model(context)
+
+    if snapshot is None:
+        return {'CANCELLED'}
+
+    write_snapshot(filepath, snapshot, mode, optimize_mesh, write_patch=write_patch)
+    
+    return {'FINISHED'}
+
+# Everything after the snapshot only touches its arrays, so this is safe to
+# run off the main thread. step(phase, progress) is called before every phase.
+#
+# With write_patch the model already at filepath is the base of a patch
+# written next to it as <filepath>.patch, the full model is still written so
+# it is the base of the next one. The patch is only written once the model
+# is, so it never describes a model that isn't on disk.
+def write_snapshot(filepath, snapshot, mode='BINARY', optimize_mesh=False, step=None, write_patch=False):
+    step = step or (lambda phase, progress: None)
+
+    step("optimize" if optimize_mesh else "finish", 0.0)
+    model = finish_model(snapshot, optimize_mesh)
+
+    patch_buffer = None
+    if write_patch:
+        step("patch", 0.3)
+        with profiling.span("patch"):
+            patch_buffer = make_model_patch(filepath, model)
+
+    step("encode", 0.4)
+    with profiling.span("encode"):
+        buffer = codec.encode_model(model, mode)
+
+    step("write", 0.9)
+    with profiling.span("write"):
+        util.write_atomic(filepath, buffer)
+        if patch_buffer is not None:
+            util.write_atomic(filepath + ".patch", patch_buffer)
+
+# The encoded patch from the model at filepath to model, None without one.
+def make_model_patch(filepath, model):
+    try:
+        base = codec.read_model(filepath)
+    except (OSError, ValueError) as error:
+        print("No base model for a patch at", filepath, error)
+        return None
+
+    model_patch = patch.make_patch(base, model)
+    buffer = patch.encode_patch(model_patch)
+
+    print("Patch has", model_patch.record_count(), "changed records,", len(buffer), "bytes")
+
+    return buffer
+
+def ExportToPack(context, filepath, name=None, optimize_mesh=False):
+    snapshot = export_active_model(context)
+
+    if snapshot is None:
+        return {'CANCELLED'}
+
+    model = finish_model(snapshot, optimize_mesh)
+
+    with profiling.span("write"):
+        pack.write_model(filepath, name or context.active_object.name, model)
+
+    return {'FINISHED'}
+
+def ImportFromPack(context, filepath, names=None):
+    try:
+        pack_file = pack.PackFile(filepath)
+    except (OSError, ValueError) as error:
+        print("Unable to open pack", filepath, error)
+        return {'CANCELLED'}
+
+    imported = 0
+
+    with pack_file:
+        for name in names or pack_file.names():
+            if name not in pack_file:
+                print("No model named", name, "in", filepath)
+                continue
+
+            with profiling.span("read"):
+                model = pack_file.read_model(name)
+            with profiling.span("convert"):
+                arrays = import_arrays(model)
+            create_object(context, "{}:{}".format(filepath, name), arrays, name=name)
+            imported += 1
+
+    if imported == 0:
+        return {'CANCELLED'}
 
     return {'FINISHED'}
 
-def Export(context, filepath):
+def export_active_model(context):
     bpy.ops.object.mode_set(mode='OBJECT')
 
     obj = context.active_object
 
     if not obj:
-        return {'CANCELLED'}
-    
+        return None
+
+    return export_object(obj)
+
+# Snapshot of a mesh object outside of edit mode, without touching the
+# active object or mode.
+def export_object(obj):
     mesh = obj.data
 
     if not mesh:
         print("Unable to export model: no mesh")
-        return {'CANCELLED'}
+        return None
 
     armature_obj = obj.find_armature()
     armature = None    
@@ -116,101 +368,170 @@ def Export(context, filepath):
             if not "label" in bone:
                 bone["label"] = bone_index
 
-    model = {
-        "vertices": [],
-        "vertex_label": [],
-        "faces": [],
-        "face_type": [],
-        "face_color": [],
-        "face_alpha": [],
-        "face_label": [],
-        "face_layer": [],
-        "texture_faces": [],
-    }
+    if not mesh.uv_layers.active:
+        print("Unable to export model: no color uv layer")
+        return None
+
+    with profiling.span("gather"):
+        return export_model(obj, mesh, armature)
+
+# The model data of a mesh object, read from blender on the main thread.
+class ModelSnapshot:
+    __slots__ = ("mesh", "bone_vertices", "bone_labels")
+
+    def __init__(self, mesh, bone_vertices, bone_labels):
+        self.mesh = mesh
+        self.bone_vertices = bone_vertices
+        self.bone_labels = bone_labels
 
-    for vertex in mesh.vertices:
-        label = 0
+def export_model(obj, mesh, armature):
+    vertex_count = len(mesh.vertices)
+    loop_count = len(mesh.loops)
+    face_count = len(mesh.polygons)
 
-        if armature:
-            bone = None
-            for vertex_group in vertex.groups:
-                if vertex_group.weight > 0.5:
-                    group = obj.vertex_groups[vertex_group.group]
-                    bone = armature.bones.get(group.name)
-                    break
-            if bone:
-                label = bone["label"]
+    co = np.empty(vertex_count * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", co)
+    vertices = util.export_vectors(co)
 
-        model["vertices"].append(util.export_vector(vertex.co))
-        model["vertex_label"].append(label)
+    vertex_label = np.zeros(vertex_count, dtype=np.int32)
 
     if armature:
-        for bone in armature.bones:
-            model["vertices"].append(util.export_vector(bone.head_local))
-            model["vertex_label"].append(255 - bone["label"])
-            
-    uv_layer = mesh.uv_layers.active.data
-    
-    backfaces = []
-    
-    for face in mesh.polygons:
-        type = 1
+        vertex_label = export_vertex_labels(obj, mesh, armature)
+
+    loop_start = np.empty(face_count, dtype=np.int32)
+    use_smooth = np.empty(face_count, dtype=bool)
+    material_index = np.empty(face_count, dtype=np.int32)
+    mesh.polygons.foreach_get("loop_start", loop_start)
+    mesh.polygons.foreach_get("use_smooth", use_smooth)
+    mesh.polygons.foreach_get("material_index", material_index)
+
+    # palette colors are sampled from the first loop of every face
+    uv = np.empty(loop_count * 2, dtype=np.float32)
+    mesh.uv_layers.active.data.foreach_get("uv", uv)
+    face_color = util.export_colors(uv.reshape(-1, 2)[loop_start])
+
+    face_type = np.where(use_smooth, 0, 1)
+
+    # per slot transparency and sidedness, faces outside the slots get the defaults
+    slot_count = len(obj.material_slots)
+    slot_alpha = np.zeros(slot_count + 1, dtype=np.int32)
+    slot_double_sided = np.zeros(slot_count + 1, dtype=bool)
+
+    for index, slot in enumerate(obj.material_slots):
+        material = slot.material
+        if material:
+            slot_alpha[index] = 255 - int(material.base_alpha * 255)
+            slot_double_sided[index] = material.double_sided
+
+    slot = np.where(material_index < slot_count, material_index, slot_count)
+    face_alpha = slot_alpha[slot]
+    double_sided = slot_double_sided[slot]
+
+    layer = 0 # TODO: pray for blender to allow multipass viewport compositing
+    face_layer = np.full(face_count, layer, dtype=np.int32)
+
+    # the format only has triangles, polygons are split the same way blender
+    # displays them and every triangle takes the attributes of its polygon
+    mesh.calc_loop_triangles()
+    triangle_count = len(mesh.loop_triangles)
+    corners = np.empty(triangle_count * 3, dtype=np.int32)
+    source = np.empty(triangle_count, dtype=np.int32)
+    mesh.loop_triangles.foreach_get("vertices", corners)
+    mesh.loop_triangles.foreach_get("polygon_index", source)
+    corners = corners.reshape(-1, 3)
+
+    model = data.Mesh(
+        vertices=vertices,
+        vertex_label=vertex_label,
+        faces=corners,
+        face_type=face_type[source],
+        face_color=face_color[source],
+        face_alpha=face_alpha[source],
+        face_label=material_index[source],
+        face_layer=face_layer[source],
+        face_double_sided=double_sided[source],
+    )
 
-        if face.use_smooth:
-            type = 0
-        
-        uv = uv_layer[face.loop_start].uv
-        u = int(uv[0] * 128)
-        v = 511 - int(uv[1] * 512)
-        color = int(u + (v * 128))
-
-        transparency = 0
-        material_index = face.material_index
-        double_sided = False
-        
-        if material_index < len(obj.material_slots):
-            material = obj.material_slots[material_index].material
-            if material:
-                transparency = 255 - int(material.base_alpha * 255)
-            if material.double_sided:
-                double_sided = True
+    # bone heads are exported as extra vertices labeled with the bone origin
+    bone_vertices = np.zeros((0, 3), dtype=np.int32)
+    bone_labels = np.zeros(0, dtype=np.int32)
 
-        layer = 0 # TODO: pray for blender to allow multipass viewport compositing
-        
-        model["faces"].append(face.vertices[:])
-        model["face_type"].append(type)
-        model["face_color"].append(color)
-        model["face_label"].append(material_index)
-        model["face_alpha"].append(transparency)
-        model["face_layer"].append(layer)
-
-        if double_sided:
-            a = face.vertices[0]
-            b = face.vertices[1]
-            c = face.vertices[2]
-            
-            backfaces.append({
-                "vertices": [c, b, a], # reverse winding
-                "type": type,
-                "color": color,
-                "label": material_index,
-                "transparency": transparency,
-                "layer": layer,
-            })
-
-    for face in backfaces:
-        model["faces"].append(face["vertices"])
-        model["face_type"].append(face["type"])
-        model["face_color"].append(face["color"])
-        model["face_label"].append(face["label"])
-        model["face_alpha"].append(face["transparency"])
-        model["face_layer"].append(face["layer"])
-        
-    with open(filepath, "w") as file:
-        if mode == 'JSON':
-            json.dump(model, file)    
-    
-    return {'FINISHED'}
+    if armature:
+        head = np.empty(len(armature.bones) * 3, dtype=np.float32)
+        armature.bones.foreach_get("head_local", head)
+        bone_vertices = util.export_vectors(head)
+        bone_labels = np.array([255 - bone["label"] for bone in armature.bones], dtype=np.int32)
+
+    return ModelSnapshot(model, bone_vertices, bone_labels)
+
+def finish_model(snapshot, optimize_mesh=False):
+    model = snapshot.mesh
+
+    if optimize_mesh:
+        with profiling.span("optimize"):
+            model = optimize.optimize_mesh(model)
+
+    # the bone vertices go after the optimized ones, so they are never welded
+    return data.Mesh(
+        vertices=np.concatenate((model.vertices, snapshot.bone_vertices)),
+        vertex_label=np.concatenate((model.vertex_label, snapshot.bone_labels)),
+        faces=model.faces,
+        face_type=model.face_type,
+        face_color=model.face_color,
+        face_alpha=model.face_alpha,
+        face_label=model.face_label,
+        face_layer=model.face_layer,
+        face_double_sided=model.face_double_sided,
+    ).expand_double_sided()
+
+# Labels every vertex with the bone of its dominant vertex group: the bone group
+# with the highest weight above 0.5, ties going to the lowest group index.
+# Vertices without such a group keep label 0.
+def export_vertex_labels(obj, mesh, armature):
+    vertex_label = np.zeros(len(mesh.vertices), dtype=np.int32)
+
+    # resolve group -> bone label once, -1 for groups that aren't bones
+    group_label = np.full(len(obj.vertex_groups), -1, dtype=np.int32)
+    for group in obj.vertex_groups:
+        bone = armature.bones.get(group.name)
+        if bone:
+            group_label[group.index] = bone["label"]
+
+    # vertex groups are ragged so they can't be read with foreach_get, flatten them in one pass
+    memberships = [
+        (vertex.index, element.group, element.weight)
+        for vertex in mesh.vertices
+        for element in vertex.groups
+    ]
+
+    if not memberships:
+        return vertex_label
+
+    table = np.array(memberships, dtype=np.float64)
+    vertex = table[:, 0].astype(np.int32)
+    group = table[:, 1].astype(np.int32)
+    weight = table[:, 2]
+
+    label = np.full(len(group), -1, dtype=np.int32)
+    known = group < len(group_label)
+    label[known] = group_label[group[known]]
+
+    keep = (label >= 0) & (weight > 0.5)
+    vertex = vertex[keep]
+    group = group[keep]
+    weight = weight[keep]
+    label = label[keep]
+
+    # sort by vertex, then heaviest weight, then lowest group so the winner comes first
+    order = np.lexsort((group, -weight, vertex))
+    vertex = vertex[order]
+    label = label[order]
+
+    first = np.ones(len(vertex), dtype=bool)
+    first[1:] = vertex[1:] != vertex[:-1]
+    vertex_label[vertex[first]] = label[first]
+
+    return vertex_label
 
 def load_image(image_path):
     current_script_path = os.path.dirname(os.path.realpath(__file__))
@@ -275,26 +596,21 @@ def create_or_update_armature_modifier(target_obj, armature_obj):
     # Assign the armature object to the modifier's "Object" field
     armature_modifier.object = armature_obj
 
-def get_label_vertices(mesh):
-    label_vertices = {}
-    label_layer = mesh.vertex_layers_int["label"]
+# The label index of a mesh, whose labels are its "label" point attribute.
+def get_label_index(mesh):
+    count = len(mesh.vertices)
+
+    label_layer = mesh.attributes.get("label")
     if label_layer is None:
-        label_layer = mesh.vertex_layers_int.new(name="label")
-    for index, vertex_data in label_layer.data.items():
-        label = vertex_data.value
-        if label not in label_vertices:
-            label_vertices[label] = []
-        label_vertices[label].append(mesh.vertices[index])
-    return label_vertices
-
-def get_label_median(label_vertices, labels):
-    vertices = []
-    for label in labels:
-        if label in label_vertices:
-            vertices.extend([v.co for v in label_vertices[label]])
-    if len(vertices) == 0:
-        return Vector((0,0,0))
-    return sum(vertices, Vector((0,0,0))) / len(vertices)
+        label_layer = mesh.attributes.new("label", 'INT', 'POINT')
+
+    vertex_labels = np.empty(count, dtype=np.int32)
+    label_layer.data.foreach_get("value", vertex_labels)
+
+    co = np.empty(count * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", co)
+
+    return data.LabelIndex(vertex_labels, co)
 
 class RS_OT_ImportModel(Operator, ImportHelper):
     """Nothing"""
@@ -306,11 +622,48 @@ class RS_OT_ImportModel(Operator, ImportHelper):
         options={'HIDDEN'},
         maxlen=255,
     )
+
+    mode: EnumProperty(
+        name="Format",
+        items=(
+            ('AUTO', "Auto Detect", "Detect the encoding from the file contents"),
+            ('BINARY', "Binary", "Protobuf encoded Mesh message"),
+            ('JSON', "JSON", "Legacy JSON encoding"),
+        ),
+        default='AUTO',
+    )
+
+    files: CollectionProperty(
+        type=bpy.types.OperatorFileListElement,
+        options={'HIDDEN', 'SKIP_SAVE'},
+    )
+
+    directory: StringProperty(
+        subtype='DIR_PATH',
+        options={'HIDDEN', 'SKIP_SAVE'},
+    )
+
+    use_cache: BoolProperty(
+        name="Use Cache",
+        description="Keeps decoded models on disk by content hash so unchanged files aren't parsed again",
+        default=True,
+    )
+
+    reuse_meshes: BoolProperty(
+        name="Reuse Meshes",
+        description="Links meshes already imported from identical files instead of building a copy. Edits to them are shared",
+        default=True,
+    )
    
     def execute(self, context):
-        return Import(context, self.filepath)
-
-class RS_OT_ExportModel(Operator, ExportHelper):
+        filepaths = [os.path.join(self.directory, file.name) for file in self.files if file.name]
+        return profiling.profile(context, "Import model", lambda: ImportFiles(context, filepaths or [self.filepath],
+            mode = self.mode,
+            use_cache = self.use_cache,
+            reuse_meshes = self.reuse_meshes,
+        ), self.report)
+
+class RS_OT_ExportModel(background.BackgroundExport, Operator, ExportHelper):
     """Nothing"""
     bl_idname = "rs.export_model"
     bl_label = "Rune Synergy (.mdl)"
@@ -321,8 +674,78 @@ class RS_OT_ExportModel(Operator, ExportHelper):
         maxlen=255,
     )
 
+    mode: EnumProperty(
+        name="Format",
+        items=(
+            ('BINARY', "Binary", "Protobuf encoded Mesh message"),
+            ('JSON', "JSON", "Legacy JSON encoding"),
+        ),
+        default='BINARY',
+    )
+
+    optimize_mesh: OPTIMIZE_MESH
+
+    write_patch: BoolProperty(
+        name="Write Patch",
+        description="Also writes a .patch of the changes against the model being replaced",
+        default=False,
+    )
+
+    def execute(self, context):
+        if not self.runs_in_background():
+            return profiling.profile(context, "Export model", lambda: Export(context, self.filepath, mode=self.mode, optimize_mesh=self.optimize_mesh, write_patch=self.write_patch), self.report)
+
+        snapshot = self.take_snapshot(context, "Export model", lambda: export_active_model(context))
+
+        if snapshot is None:
+            return {'CANCELLED'}
+
+        filepath, mode, optimize_mesh, write_patch = self.filepath, self.mode, self.optimize_mesh, self.write_patch
+        return self.start_job(context, "Exporting model", lambda step: write_snapshot(filepath, snapshot, mode, optimize_mesh, step, write_patch))
+
+class RS_OT_ImportPackModel(Operator, ImportHelper):
+    """Imports models from a Rune Synergy asset pack"""
+    bl_idname = "rs.import_pack_model"
+    bl_label = "Rune Synergy Pack (.rspk)"
+    filename_ext = ".rspk"
+    filter_glob: StringProperty(
+        default="*.rspk",
+        options={'HIDDEN'},
+        maxlen=255,
+    )
+
+    names: StringProperty(
+        name="Models",
+        description="Comma separated names of the models to import, all of them when empty",
+        default="",
+    )
+
+    def execute(self, context):
+        names = [name.strip() for name in self.names.split(",") if name.strip()]
+        return profiling.profile(context, "Import pack", lambda: ImportFromPack(context, self.filepath, names), self.report)
+
+class RS_OT_ExportPackModel(Operator, ExportHelper):
+    """Adds the active model to a Rune Synergy asset pack, replacing an entry of the same name"""
+    bl_idname = "rs.export_pack_model"
+    bl_label = "Rune Synergy Pack (.rspk)"
+    filename_ext = ".rspk"
+    check_existing = False
+    filter_glob: StringProperty(
+        default="*.rspk",
+        options={'HIDDEN'},
+        maxlen=255,
+    )
+
+    entry_name: StringProperty(
+        name="Name",
+        description="Name of the entry in the pack, the object name when empty",
+        default="",
+    )
+
+    optimize_mesh: OPTIMIZE_MESH
+
     def execute(self, context):
-        return Export(context, self.filepath)
+        return profiling.profile(context, "Export pack", lambda: ExportToPack(context, self.filepath, self.entry_name, self.optimize_mesh), self.report)
 
 class RS_OT_FaceGroup_Create(Operator):
     """Create a new face group"""
@@ -451,6 +874,8 @@ def material_double_sided_update(self, context):
 __classes__ = (
     RS_OT_ImportModel,
     RS_OT_ExportModel,
+    RS_OT_ImportPackModel,
+    RS_OT_ExportPackModel,
     RS_OT_FaceGroup_Create,
     RS_OT_FaceGroup_Delete,
     RS_OT_FaceGroup_Assign,
@@ -463,6 +888,8 @@ __classes__ = (
 __properties__ = {
     bpy.types.Mesh: {
         "import_path": StringProperty(name="Import Path", description="The path this mesh was imported from"),
+        "import_hash": StringProperty(name="Import Hash", description="Content hash of the file this mesh was imported from"),
+        "import_geometry": StringProperty(name="Import Geometry", description="Hash of the geometry as imported, meshes edited since aren't reused"),
     },
     bpy.types.Material: {
         "base_alpha": FloatProperty(name="Base Alpha", description="The alpha values the triangles assigned to this group will begin with", default=1, min=0, max=1,precision=3, update=material_base_alpha_update),
@@ -471,6 +898,12 @@ __properties__ = {
 }
 
 __extensions__ = {
-    bpy.types.TOPBAR_MT_file_import: [lambda self, context: self.layout.operator(RS_OT_ImportModel.bl_idname)],
-    bpy.types.TOPBAR_MT_file_export: [lambda self, context: self.layout.operator(RS_OT_ExportModel.bl_idname)],
+    bpy.types.TOPBAR_MT_file_import: [
+        lambda self, context: self.layout.operator(RS_OT_ImportModel.bl_idname),
+        lambda self, context: self.layout.operator(RS_OT_ImportPackModel.bl_idname),
+    ],
+    bpy.types.TOPBAR_MT_file_export: [
+        lambda self, context: self.layout.operator(RS_OT_ExportModel.bl_idname),
+        lambda self, context: self.layout.operator(RS_OT_ExportPackModel.bl_idname),
+    ],
 }
@@ -0,0 +1,163 @@
+# Export time clean up of a data.Mesh: welds vertices that became identical
+# after quantization, drops faces that collapsed or are listed twice, and
+# orders faces and vertices for the post transform vertex cache.
+
+import numpy as np
+
+from . import data
+
+CACHE_SIZE = 16
+
+def take_faces(mesh, indices):
+    return data.Mesh(
+        vertices=mesh.vertices,
+        vertex_label=mesh.vertex_label,
+        faces=mesh.faces[indices],
+        face_type=mesh.face_type[indices],
+        face_color=mesh.face_color[indices],
+        face_alpha=mesh.face_alpha[indices],
+        face_label=mesh.face_label[indices],
+        face_layer=mesh.face_layer[indices],
+        face_double_sided=mesh.face_double_sided[indices],
+        texture_faces=mesh.texture_faces,
+    )
+
+# Moves vertex old_index[i] to i, faces and texture faces are remapped
+# through new_index.
+def remap_vertices(mesh, old_index, new_index):
+    return data.Mesh(
+        vertices=mesh.vertices[old_index],
+        vertex_label=mesh.vertex_label[old_index],
+        faces=new_index[mesh.faces],
+        face_type=mesh.face_type,
+        face_color=mesh.face_color,
+        face_alpha=mesh.face_alpha,
+        face_label=mesh.face_label,
+        face_layer=mesh.face_layer,
+        face_double_sided=mesh.face_double_sided,
+        texture_faces=new_index[mesh.texture_faces],
+    )
+
+# Unique rows in order of first appearance, and the new index of every row.
+def first_unique(rows):
+    _, first, inverse = np.unique(rows, axis=0, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return first[order], rank[inverse.ravel()]
+
+def weld_vertices(mesh):
+    if mesh.vertex_count == 0:
+        return mesh
+    keys = np.column_stack((mesh.vertices, mesh.vertex_label))
+    first, new_index = first_unique(keys)
+    return remap_vertices(mesh, first, new_index)
+
+# Faces with a repeated vertex or with collinear corners have no area.
+def remove_degenerate_faces(mesh):
+    faces = mesh.faces
+    a, b, c = (mesh.vertices[faces[:, axis]].astype(np.int64) for axis in range(3))
+    area = np.cross(b - a, c - a).any(axis=1)
+    keep = area & (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])
+    return take_faces(mesh, np.flatnonzero(keep))
+
+# A face is a duplicate when an earlier face has the same corners with the
+# same winding. Reversed faces are kept, they are the back of the face.
+def remove_duplicate_faces(mesh):
+    if mesh.face_count == 0:
+        return mesh
+    faces = mesh.faces
+    shift = np.argmin(faces, axis=1)
+    rotated = faces[np.arange(len(faces))[:, None], (shift[:, None] + np.arange(3)) % 3]
+    first, _ = first_unique(rotated)
+    return take_faces(mesh, np.sort(first))
+
+# Tipsify (Sander, Nehab and Barczak 2007): fans around the vertex most
+# likely to still be in the cache, with a dead end stack for when a fan runs
+# out of live neighbours. Returns the new face order.
+def tipsify(faces, vertex_count, cache_size=CACHE_SIZE):
+    face_count = len(faces)
+    corners = faces.ravel()
+
+    live = np.bincount(corners, minlength=vertex_count).tolist()
+    adjacency_offsets = np.zeros(vertex_count + 1, dtype=np.int64)
+    adjacency_offsets[1:] = np.cumsum(live)
+    adjacency = (np.argsort(corners, kind="stable") // 3).tolist()
+    adjacency_offsets = adjacency_offsets.tolist()
+    face_list = faces.tolist()
+
+    timestamps = [0] * vertex_count
+    emitted = [False] * face_count
+    dead_end = []
+    order = []
+    time = cache_size + 1
+    cursor = 0
+    fanning = 0
+
+    while fanning >= 0:
+        candidates = []
+
+        for face in adjacency[adjacency_offsets[fanning]:adjacency_offsets[fanning + 1]]:
+            if emitted[face]:
+                continue
+            emitted[face] = True
+            order.append(face)
+            for vertex in face_list[face]:
+                dead_end.append(vertex)
+                candidates.append(vertex)
+                live[vertex] -= 1
+                if time - timestamps[vertex] > cache_size:
+                    timestamps[vertex] = time
+                    time += 1
+
+        # the candidate that stays in the cache while its remaining faces are emitted
+        fanning = -1
+        best = -1
+        for vertex in candidates:
+            if live[vertex] > 0:
+                priority = 0
+                if time - timestamps[vertex] + 2 * live[vertex] <= cache_size:
+                    priority = time - timestamps[vertex]
+                if priority > best:
+                    best = priority
+                    fanning = vertex
+
+        if fanning >= 0:
+            continue
+
+        while dead_end:
+            vertex = dead_end.pop()
+            if live[vertex] > 0:
+                fanning = vertex
+                break
+        else:
+            while cursor < vertex_count and live[cursor] == 0:
+                cursor += 1
+            if cursor < vertex_count:
+                fanning = cursor
+
+    return np.array(order, dtype=np.int64)
+
+# Orders faces with tipsify and then vertices by first use. Vertices no face
+# uses are kept at the end, their labels still place rig origins.
+def reorder_for_cache(mesh, cache_size=CACHE_SIZE):
+    if mesh.face_count == 0:
+        return mesh
+
+    mesh = take_faces(mesh, tipsify(mesh.faces, mesh.vertex_count, cache_size))
+
+    corners = mesh.faces.ravel()
+    used = np.zeros(mesh.vertex_count, dtype=bool)
+    used[corners] = True
+    _, first = np.unique(corners, return_index=True)
+    old_index = np.concatenate((corners[np.sort(first)], np.flatnonzero(~used)))
+
+    new_index = np.empty(mesh.vertex_count, dtype=np.int64)
+    new_index[old_index] = np.arange(mesh.vertex_count)
+    return remap_vertices(mesh, old_index, new_index)
+
+def optimize_mesh(mesh, cache_size=CACHE_SIZE):
+    mesh = weld_vertices(mesh)
+    mesh = remove_degenerate_faces(mesh)
+    mesh = remove_duplicate_faces(mesh)
+    return reorder_for_cache(mesh, cache_size)
@@ -0,0 +1,218 @@
+import os
+import mmap
+import struct
+import hashlib
+import numpy as np
+
+from . import data
+
+# Asset pack: many models in one file, laid out so that a reader can mmap it
+# and view every column in place with numpy.frombuffer.
+#
+#   header   magic, version, entry count, index offset and length
+#   blocks   one per entry, 8 byte aligned, see MODEL_COLUMNS
+#   index    name, block offset, block length and sha256 of every entry
+#
+# New and replaced entries are appended after the last index followed by a
+# fresh index, and the header is rewritten last. Space of replaced entries
+# and old indices is only reclaimed by compact().
+
+MAGIC = b"RSPK"
+VERSION = 1
+
+HEADER = struct.Struct("<4sIIIQQ")
+BLOCK_HEADER = struct.Struct("<III4x")
+INDEX_ENTRY = struct.Struct("<QQ32s")
+NAME_LENGTH = struct.Struct("<H")
+
+ALIGNMENT = 8
+
+# (column, values per element, element count) of a model block, all int32
+MODEL_COLUMNS = (
+    ("vertices", 3, "vertex_count"),
+    ("vertex_label", 1, "vertex_count"),
+    ("faces", 3, "face_count"),
+    ("face_type", 1, "face_count"),
+    ("face_color", 1, "face_count"),
+    ("face_alpha", 1, "face_count"),
+    ("face_label", 1, "face_count"),
+    ("face_layer", 1, "face_count"),
+    ("texture_faces", 3, "texture_face_count"),
+)
+
+class PackError(ValueError):
+    pass
+
+def align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def encode_model(mesh):
+    mesh = mesh.expand_double_sided()
+
+    counts = {
+        "vertex_count": mesh.vertex_count,
+        "face_count": mesh.face_count,
+        "texture_face_count": len(mesh.texture_faces),
+    }
+
+    parts = [BLOCK_HEADER.pack(counts["vertex_count"], counts["face_count"], counts["texture_face_count"])]
+
+    for name, width, count in MODEL_COLUMNS:
+        column = np.asarray(getattr(mesh, name), dtype="<i4").reshape(-1)
+        if len(column) != counts[count] * width:
+            raise PackError("column {} has {} values, expected {}".format(name, len(column), counts[count] * width))
+        parts.append(column.tobytes())
+        parts.append(bytes(align(len(column) * 4) - len(column) * 4))
+
+    return b"".join(parts)
+
+def decode_model(buffer, offset=0):
+    vertex_count, face_count, texture_face_count = BLOCK_HEADER.unpack_from(buffer, offset)
+    counts = {
+        "vertex_count": vertex_count,
+        "face_count": face_count,
+        "texture_face_count": texture_face_count,
+    }
+
+    columns = {}
+    offset += BLOCK_HEADER.size
+
+    for name, width, count in MODEL_COLUMNS:
+        length = counts[count] * width
+        columns[name] = np.frombuffer(buffer, dtype="<i4", count=length, offset=offset)
+        offset += align(length * 4)
+
+    # int32 columns are passed through by the Mesh as views, nothing is copied
+    return data.Mesh(**columns)
+
+def read_index(file):
+    file.seek(0)
+    header = file.read(HEADER.size)
+
+    if len(header) == 0:
+        return {}, HEADER.size
+
+    if len(header) < HEADER.size:
+        raise PackError("truncated pack header")
+
+    magic, version, entry_count, _, index_offset, index_length = HEADER.unpack(header)
+
+    if magic != MAGIC:
+        raise PackError("not an asset pack")
+    if version != VERSION:
+        raise PackError("unsupported pack version {}".format(version))
+
+    file.seek(index_offset)
+    buffer = file.read(index_length)
+
+    if len(buffer) != index_length:
+        raise PackError("truncated pack index")
+
+    index = {}
+    pos = 0
+
+    for _ in range(entry_count):
+        name_length, = NAME_LENGTH.unpack_from(buffer, pos)
+        pos += NAME_LENGTH.size
+        name = buffer[pos:pos + name_length].decode("utf-8")
+        pos += name_length
+        index[name] = INDEX_ENTRY.unpack_from(buffer, pos)
+        pos += INDEX_ENTRY.size
+
+    return index, index_offset + index_length
+
+def write_index(file, index, offset):
+    parts = []
+    for name, entry in index.items():
+        encoded = name.encode("utf-8")
+        parts.append(NAME_LENGTH.pack(len(encoded)))
+        parts.append(encoded)
+        parts.append(INDEX_ENTRY.pack(*entry))
+
+    buffer = b"".join(parts)
+
+    file.seek(offset)
+    file.write(buffer)
+    file.truncate()
+    file.flush()
+    os.fsync(file.fileno())
+
+    # the header goes last, until then readers still see the previous index
+    file.seek(0)
+    file.write(HEADER.pack(MAGIC, VERSION, len(index), 0, offset, len(buffer)))
+    file.flush()
+
+def write_models(filepath, models):
+    mode = "r+b" if os.path.exists(filepath) else "w+b"
+
+    with open(filepath, mode) as file:
+        index, end = read_index(file)
+        offset = align(end)
+
+        file.seek(end)
+        file.write(bytes(offset - end))
+
+        for name, model in models.items():
+            block = encode_model(model)
+            file.write(block)
+            index[name] = (offset, len(block), hashlib.sha256(block).digest())
+            offset += len(block)
+
+        write_index(file, index, offset)
+
+def write_model(filepath, name, model):
+    write_models(filepath, {name: model})
+
+def compact(filepath):
+    temp_path = filepath + ".tmp"
+
+    with PackFile(filepath) as pack:
+        models = {name: pack.read_model(name) for name in pack.names()}
+        write_models(temp_path, models)
+        del models
+
+    os.replace(temp_path, filepath)
+
+# Read access to a pack through a shared memory map. Models returned by
+# read_model are views into the map, so they stay valid only while the pack
+# is open.
+class PackFile:
+    __slots__ = ("file", "map", "index")
+
+    def __init__(self, filepath):
+        self.file = open(filepath, "rb")
+        self.index, _ = read_index(self.file)
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        try:
+            self.map.close()
+        except BufferError:
+            # views are still alive, the map is released once they are
+            pass
+        self.file.close()
+
+    def names(self):
+        return list(self.index)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def read_model(self, name, verify=False):
+        entry = self.index.get(name)
+
+        if entry is None:
+            raise KeyError(name)
+
+        offset, length, digest = entry
+
+        if verify and hashlib.sha256(self.map[offset:offset + length]).digest() != digest:
+            raise PackError("entry {} is corrupt".format(name))
+
+        return decode_model(self.map, offset)
@@ -0,0 +1,220 @@
+# Patches between two versions of a model, see MeshPatch in format.proto.
+#
+#   python -m rune_synergy.patch diff old.mdl new.mdl new.mdl.patch
+#   python -m rune_synergy.patch apply old.mdl new.mdl.patch new.mdl
+#
+# Meshes are compared record by record in their binary form: a vertex is
+# (x, y, z, label), a face (a, b, c, label, color, alpha, smooth). Layers
+# aren't part of the binary format, so not of patches either, and double
+# sided faces are compared as the backfaces it stores for them.
+
+import sys
+import hashlib
+import argparse
+import numpy as np
+
+from . import data, proto, codec, util
+
+VERTEX_FIELDS = ("x", "y", "z", "label")
+FACE_FIELDS = ("a", "b", "c", "label", "color", "transparency", "smooth")
+TEXTURE_FACE_FIELDS = ("a", "b", "c")
+
+# unchanged records a range may span before it is split in two, a range
+# header costs about as much as one record
+RANGE_GAP = 1
+
+class PatchError(ValueError):
+    pass
+
+class MeshPatch:
+    __slots__ = (
+        "base_hash",
+        "result_hash",
+        "vertex_count",
+        "face_count",
+        "texture_face_count",
+        "vertex_ranges",
+        "face_ranges",
+        "texture_face_ranges",
+    )
+
+    def __init__(self, base_hash, result_hash, vertex_count, face_count, texture_face_count,
+            vertex_ranges=(), face_ranges=(), texture_face_ranges=()):
+        self.base_hash = base_hash
+        self.result_hash = result_hash
+        self.vertex_count = vertex_count
+        self.face_count = face_count
+        self.texture_face_count = texture_face_count
+        self.vertex_ranges = list(vertex_ranges)
+        self.face_ranges = list(face_ranges)
+        self.texture_face_ranges = list(texture_face_ranges)
+
+    # number of records the patch carries
+    def record_count(self):
+        return sum(len(rows) for _, rows in self.vertex_ranges + self.face_ranges + self.texture_face_ranges)
+
+def mesh_hash(mesh):
+    return hashlib.sha256(codec.encode_model(mesh, 'BINARY')).digest()
+
+def vertex_rows(mesh):
+    return np.column_stack((mesh.vertices, mesh.vertex_label)).astype(np.int64)
+
+def face_rows(mesh):
+    smooth = (mesh.face_type & 1) == 0
+    return np.column_stack((mesh.faces, mesh.face_label, mesh.face_color, mesh.face_alpha, smooth)).astype(np.int64)
+
+def texture_face_rows(mesh):
+    return mesh.texture_faces.astype(np.int64)
+
+def rows_to_mesh(vertices, faces, texture_faces):
+    return data.Mesh(
+        vertices=vertices[:, 0:3],
+        vertex_label=vertices[:, 3],
+        faces=faces[:, 0:3],
+        face_label=faces[:, 3],
+        face_color=faces[:, 4],
+        face_alpha=faces[:, 5],
+        face_type=np.where(faces[:, 6] != 0, 0, 1),
+        texture_faces=texture_faces,
+    )
+
+# (start, rows) ranges of the rows of new that differ from old or are past
+# its end.
+def diff_rows(old, new, gap=RANGE_GAP):
+    common = min(len(old), len(new))
+    changed = np.ones(len(new), dtype=bool)
+    changed[:common] = (old[:common] != new[:common]).any(axis=1)
+
+    indices = np.flatnonzero(changed)
+
+    if len(indices) == 0:
+        return []
+
+    breaks = np.flatnonzero(np.diff(indices) > gap + 1)
+    starts = indices[np.concatenate(([0], breaks + 1))]
+    ends = indices[np.concatenate((breaks, [len(indices) - 1]))] + 1
+
+    return [(int(start), new[start:end]) for start, end in zip(starts.tolist(), ends.tolist())]
+
+def apply_rows(old, count, ranges, width):
+    rows = np.zeros((count, width), dtype=np.int64)
+    common = min(len(old), count)
+    rows[:common] = old[:common]
+
+    for start, values in ranges:
+        if start + len(values) > count:
+            raise PatchError("range {}..{} is past the end of {} records".format(start, start + len(values), count))
+        rows[start:start + len(values)] = values
+
+    return rows
+
+def make_patch(base, mesh):
+    base = base.expand_double_sided()
+    mesh = mesh.expand_double_sided()
+
+    return MeshPatch(
+        base_hash=mesh_hash(base),
+        result_hash=mesh_hash(mesh),
+        vertex_count=mesh.vertex_count,
+        face_count=mesh.face_count,
+        texture_face_count=len(mesh.texture_faces),
+        vertex_ranges=diff_rows(vertex_rows(base), vertex_rows(mesh)),
+        face_ranges=diff_rows(face_rows(base), face_rows(mesh)),
+        texture_face_ranges=diff_rows(texture_face_rows(base), texture_face_rows(mesh)),
+    )
+
+def apply_patch(base, patch, verify=True):
+    base = base.expand_double_sided()
+
+    if verify and mesh_hash(base) != patch.base_hash:
+        raise PatchError("patch was made against a different base model")
+
+    mesh = rows_to_mesh(
+        apply_rows(vertex_rows(base), patch.vertex_count, patch.vertex_ranges, len(VERTEX_FIELDS)),
+        apply_rows(face_rows(base), patch.face_count, patch.face_ranges, len(FACE_FIELDS)),
+        apply_rows(texture_face_rows(base), patch.texture_face_count, patch.texture_face_ranges, len(TEXTURE_FACE_FIELDS)),
+    )
+
+    if verify and mesh_hash(mesh) != patch.result_hash:
+        raise PatchError("patched model doesn't match the patch")
+
+    return mesh
+
+def encode_ranges(ranges, name, fields):
+    return [
+        {"start": start, name: [dict(zip(fields, row)) for row in rows.tolist()]}
+        for start, rows in ranges
+    ]
+
+def decode_ranges(ranges, name, fields):
+    return [
+        (item["start"], np.array([[record[field] for field in fields] for record in item[name]], dtype=np.int64).reshape(-1, len(fields)))
+        for item in ranges
+    ]
+
+def encode_patch(patch):
+    return proto.encode("MeshPatch", {
+        "base_hash": patch.base_hash,
+        "result_hash": patch.result_hash,
+        "vertex_count": patch.vertex_count,
+        "face_count": patch.face_count,
+        "texture_face_count": patch.texture_face_count,
+        "vertices": encode_ranges(patch.vertex_ranges, "vertices", VERTEX_FIELDS),
+        "faces": encode_ranges(patch.face_ranges, "faces", FACE_FIELDS),
+        "texture_faces": encode_ranges(patch.texture_face_ranges, "texture_faces", TEXTURE_FACE_FIELDS),
+    })
+
+def decode_patch(buffer):
+    message = proto.decode("MeshPatch", buffer)
+    return MeshPatch(
+        base_hash=message["base_hash"],
+        result_hash=message["result_hash"],
+        vertex_count=message["vertex_count"],
+        face_count=message["face_count"],
+        texture_face_count=message["texture_face_count"],
+        vertex_ranges=decode_ranges(message["vertices"], "vertices", VERTEX_FIELDS),
+        face_ranges=decode_ranges(message["faces"], "faces", FACE_FIELDS),
+        texture_face_ranges=decode_ranges(message["texture_faces"], "texture_faces", TEXTURE_FACE_FIELDS),
+    )
+
+def read_patch(filepath):
+    with open(filepath, "rb") as file:
+        buffer = file.read()
+    return decode_patch(buffer)
+
+def write_patch(filepath, patch):
+    util.write_atomic(filepath, encode_patch(patch))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Make and apply Rune Synergy model patches")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    diff = commands.add_parser("diff", help="write the patch from one model to another")
+    diff.add_argument("base")
+    diff.add_argument("model")
+    diff.add_argument("patch")
+
+    apply = commands.add_parser("apply", help="write the model a patch makes of its base")
+    apply.add_argument("base")
+    apply.add_argument("patch")
+    apply.add_argument("model")
+    apply.add_argument("--to", dest="mode", choices=("BINARY", "JSON"), type=str.upper, default="BINARY", help="encoding of the patched model")
+
+    args = parser.parse_args(argv)
+
+    try:
+        base = codec.read_model(args.base)
+        if args.command == "diff":
+            patch = make_patch(base, codec.read_model(args.model))
+            write_patch(args.patch, patch)
+            print("{} records changed, {} bytes".format(patch.record_count(), len(encode_patch(patch))))
+        else:
+            util.write_atomic(args.model, codec.encode_model(apply_patch(base, read_patch(args.patch)), args.mode))
+    except (OSError, ValueError) as error:
+        print(error, file=sys.stderr)
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+import os
+import bpy
+import json
+import time
+import threading
+import tracemalloc
+
+from contextlib import contextmanager
+from bpy.types import Panel, PropertyGroup
+from bpy.props import StringProperty, BoolProperty, PointerProperty
+
+# Opt-in timing of the phases of an import or export. Phases are marked with
+# `with profiling.span("decode"):` and cost nothing unless an operator runs
+# under run(). Spans from worker threads are recorded too, their memory is
+# only a rough figure since tracemalloc counts every thread.
+
+class Span:
+    __slots__ = ("name", "start", "seconds", "memory", "thread")
+
+    def __init__(self, name, start, seconds, memory, thread):
+        self.name = name
+        self.start = start
+        self.seconds = seconds
+        self.memory = memory
+        self.thread = thread
+
+class Profile:
+    __slots__ = ("name", "spans", "start", "seconds", "trace_memory", "peak_memory", "trace_path", "started_tracing")
+
+    def __init__(self, name, trace_memory=False, trace_path=None):
+        self.name = name
+        self.spans = []
+        self.start = time.perf_counter()
+        self.seconds = 0.0
+        self.trace_memory = trace_memory
+        self.peak_memory = 0
+        self.trace_path = trace_path
+        self.started_tracing = False
+
+    # (name, seconds, memory, count) of every span name, in order of first use
+    def totals(self):
+        totals = {}
+        for span in self.spans:
+            total = totals.setdefault(span.name, [0.0, 0, 0])
+            total[0] += span.seconds
+            total[1] += span.memory
+            total[2] += 1
+        return [(name, seconds, memory, count) for name, (seconds, memory, count) in totals.items()]
+
+    def summary(self):
+        phases = []
+        for name, seconds, memory, count in self.totals():
+            phase = "{} {:.1f} ms".format(name, seconds * 1000)
+            if count > 1:
+                phase += " ({}x)".format(count)
+            if self.trace_memory:
+                phase += " {:+.1f} MB".format(memory / (1024 * 1024))
+            phases.append(phase)
+
+        message = "{} {:.1f} ms".format(self.name, self.seconds * 1000)
+        if self.trace_memory:
+            message += ", peak {:.1f} MB".format(self.peak_memory / (1024 * 1024))
+        if phases:
+            message += ": " + ", ".join(phases)
+        return message
+
+    # chrome://tracing and Perfetto trace event format, times in microseconds
+    def to_trace(self):
+        pid = os.getpid()
+        events = [{
+            "name": self.name,
+            "ph": "X",
+            "ts": 0,
+            "dur": self.seconds * 1e6,
+            "pid": pid,
+            "tid": threading.main_thread().ident,
+            "args": {"peak_memory": self.peak_memory} if self.trace_memory else {},
+        }]
+
+        for span in self.spans:
+            events.append({
+                "name": span.name,
+                "ph": "X",
+                "ts": span.start * 1e6,
+                "dur": span.seconds * 1e6,
+                "pid": pid,
+                "tid": span.thread,
+                "args": {"memory": span.memory} if self.trace_memory else {},
+            })
+
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_trace(self, filepath):
+        with open(filepath, "w") as file:
+            json.dump(self.to_trace(), file)
+
+# the profile being recorded, and the last finished one for the panel
+current = None
+last = None
+
+# profiles bound to single threads, see recording()
+local = threading.local()
+
+@contextmanager
+def span(name):
+    profile = getattr(local, "profile", current)
+
+    if profile is None:
+        yield
+        return
+
+    memory = tracemalloc.get_traced_memory()[0] if profile.trace_memory else 0
+    start = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        if profile.trace_memory:
+            memory = tracemalloc.get_traced_memory()[0] - memory
+        profile.spans.append(Span(name, start - profile.start, seconds, memory, threading.get_ident()))
+
+# Starts recording spans into a new profile until finish() is called with it.
+def start(name, trace_memory=False, trace_path=None):
+    global current
+
+    profile = Profile(name, trace_memory, trace_path)
+
+    profile.started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if profile.started_tracing:
+        tracemalloc.start()
+
+    current = profile
+    return profile
+
+def finish(profile, report=None):
+    global current, last
+
+    if current is profile:
+        current = None
+    profile.seconds = time.perf_counter() - profile.start
+
+    if profile.trace_memory:
+        profile.peak_memory = tracemalloc.get_traced_memory()[1]
+    if profile.started_tracing:
+        tracemalloc.stop()
+
+    last = profile
+    message = profile.summary()
+
+    if report:
+        report({'INFO'}, message)
+    else:
+        print(message)
+
+    if profile.trace_path:
+        try:
+            profile.write_trace(profile.trace_path)
+        except OSError as error:
+            print("Unable to write profile trace", profile.trace_path, error)
+
+# Records the spans of this thread into profile, None included, instead of
+# the current one. Work that outlives the operator that started it, like the
+# background exports, keeps its own profile this way.
+@contextmanager
+def recording(profile):
+    local.profile = profile
+    try:
+        yield
+    finally:
+        del local.profile
+
+# Stops recording into profile from other threads, finish() still has to be
+# called with it.
+def detach(profile):
+    global current
+
+    if current is profile:
+        current = None
+
+def run(name, func, trace_memory=False, trace_path=None, report=None):
+    profile = start(name, trace_memory, trace_path)
+
+    try:
+        return func()
+    finally:
+        finish(profile, report)
+
+# Starts a profile under the profiling settings of the scene, None when
+# profiling is off.
+def begin(context, name):
+    settings = context.scene.rs_profiling
+
+    if not settings.enabled:
+        return None
+
+    trace_path = bpy.path.abspath(settings.trace_path) if settings.trace_path else None
+    return start(name, settings.trace_memory, trace_path)
+
+# Runs func under the profiling settings of the scene.
+def profile(context, name, func, report=None):
+    recording = begin(context, name)
+
+    if recording is None:
+        return func()
+
+    try:
+        return func()
+    finally:
+        finish(recording, report)
+
+class RS_ProfilingSettings(PropertyGroup):
+    enabled: BoolProperty(
+        name="Profile",
+        description="Times every phase of the Rune Synergy imports and exports",
+        default=False,
+    )
+
+    trace_memory: BoolProperty(
+        name="Memory",
+        description="Also measures allocations with tracemalloc, which slows everything down",
+        default=False,
+    )
+
+    trace_path: StringProperty(
+        name="Trace File",
+        description="JSON trace of the last run, for chrome://tracing or Perfetto",
+        subtype='FILE_PATH',
+        default="",
+    )
+
+class RS_PT_Profiling(Panel):
+    bl_idname = "RS_PT_Profiling"
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = 'UI'
+    bl_category = "Rune Synergy"
+    bl_label = "Profiling"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw(self, context):
+        layout = self.layout
+        settings = context.scene.rs_profiling
+
+        row = layout.row()
+        row.prop(settings, "enabled")
+        row.prop(settings, "trace_memory")
+        layout.prop(settings, "trace_path")
+
+        if last is None:
+            return
+
+        box = layout.box()
+        box.label(text="{}: {:.1f} ms".format(last.name, last.seconds * 1000))
+
+        for name, seconds, memory, count in last.totals():
+            row = box.row()
+            row.label(text=name if count == 1 else "{} ({}x)".format(name, count))
+            row.label(text="{:.1f} ms".format(seconds * 1000))
+            if last.trace_memory:
+                row.label(text="{:+.1f} MB".format(memory / (1024 * 1024)))
+
+__classes__ = (
+    RS_ProfilingSettings,
+    RS_PT_Profiling,
+)
+
+__properties__ = {
+    bpy.types.Scene: {
+        "rs_profiling": PointerProperty(type=RS_ProfilingSettings),
+    },
+}
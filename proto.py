@@ -0,0 +1,852 @@
+# Minimal protobuf wire format codec for the messages in format.proto. Blender
+# doesn't ship the protobuf runtime, so the encoding is done by hand here.
+
+import numpy as np
+
+WIRE_VARINT = 0
+WIRE_FIXED64 = 1
+WIRE_LENGTH = 2
+WIRE_FIXED32 = 5
+
+REPEATED = "repeated"
+OPTIONAL = "optional"
+
+SCALARS = {"uint32", "sint32", "bool"}
+
+# (number, name, type, label) for every field, mirroring format.proto. Map
+# fields use a ("map", key_type, value_type) tuple as their type.
+SCHEMA = {
+    "Vertex": (
+        (1, "x", "sint32", None),
+        (2, "y", "sint32", None),
+        (3, "z", "sint32", None),
+        (4, "label", "uint32", None),
+    ),
+    "Face": (
+        (1, "a", "uint32", None),
+        (2, "b", "uint32", None),
+        (3, "c", "uint32", None),
+        (4, "label", "uint32", None),
+        (5, "color", "uint32", None),
+        (6, "transparency", "uint32", None),
+        (7, "smooth", "bool", None),
+        (8, "texture_face_id", "uint32", None),
+    ),
+    "TextureFace": (
+        (1, "a", "uint32", None),
+        (2, "b", "uint32", None),
+        (3, "c", "uint32", None),
+    ),
+    "Mesh": (
+        (1, "vertices", "Vertex", REPEATED),
+        (2, "faces", "Face", REPEATED),
+        (3, "texture_faces", "TextureFace", REPEATED),
+    ),
+    "MeshPatch": (
+        (1, "base_hash", "bytes", None),
+        (2, "result_hash", "bytes", None),
+        (3, "vertex_count", "uint32", None),
+        (4, "face_count", "uint32", None),
+        (5, "texture_face_count", "uint32", None),
+        (6, "vertices", "VertexRange", REPEATED),
+        (7, "faces", "FaceRange", REPEATED),
+        (8, "texture_faces", "TextureFaceRange", REPEATED),
+    ),
+    "VertexRange": (
+        (1, "start", "uint32", None),
+        (2, "vertices", "Vertex", REPEATED),
+    ),
+    "FaceRange": (
+        (1, "start", "uint32", None),
+        (2, "faces", "Face", REPEATED),
+    ),
+    "TextureFaceRange": (
+        (1, "start", "uint32", None),
+        (2, "texture_faces", "TextureFace", REPEATED),
+    ),
+    "Rig": (
+        (1, "vertex_groups", "VertexGroup", REPEATED),
+        (2, "face_groups", "FaceGroup", REPEATED),
+    ),
+    "VertexGroup": (
+        (1, "name", "string", None),
+        (2, "inherit_scale", "bool", None),
+        (3, "origin_labels", "uint32", REPEATED),
+        (4, "labels", "uint32", REPEATED),
+        (5, "children", "string", REPEATED),
+    ),
+    "FaceGroup": (
+        (1, "name", "string", None),
+        (2, "labels", "uint32", REPEATED),
+    ),
+    "Animation": (
+        (1, "frames", "AnimationFrameRef", REPEATED),
+        (2, "skip_bases", "uint32", REPEATED),
+        (3, "loop", "AnimationLoop", OPTIONAL),
+        (4, "overrides", "AnimationOverrides", OPTIONAL),
+        (5, "priority", "uint32", None),
+        (6, "stretch", "bool", None),
+    ),
+    "AnimationArchive": (
+        (1, "animations", ("map", "string", "Animation"), None),
+        (2, "frames", "AnimationFrame", REPEATED),
+    ),
+    "AnimationFrameRef": (
+        (1, "primary_frame_id", "uint32", None),
+        (2, "secondary_frame_id", "uint32", None),
+        (3, "duration", "uint32", None),
+    ),
+    "AnimationLoop": (
+        (1, "offset_from_end", "uint32", None),
+        (2, "count", "uint32", None),
+    ),
+    "AnimationOverrides": (
+        (1, "player_right_hand", "uint32", OPTIONAL),
+        (2, "player_left_hand", "uint32", OPTIONAL),
+    ),
+    "AnimationFrame": (
+        (1, "transforms", ("map", "string", "AnimationTransform"), None),
+        (2, "alphas", ("map", "string", "sint32"), None),
+        (3, "duration", "uint32", None),
+    ),
+    "AnimationTransform": (
+        (1, "rotate", "Vector", OPTIONAL),
+        (2, "translate", "Vector", OPTIONAL),
+        (3, "scale", "Vector", OPTIONAL),
+    ),
+    "Vector": (
+        (1, "x", "sint32", None),
+        (2, "y", "sint32", None),
+        (3, "z", "sint32", None),
+    ),
+}
+
+class DecodeError(ValueError):
+    pass
+
+def zigzag_encode(value):
+    if value >= 0:
+        return value << 1
+    return ((-value) << 1) - 1
+
+def zigzag_decode(value):
+    return (value >> 1) ^ -(value & 1)
+
+def write_varint(out, value):
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def read_varint(buf, pos):
+    result = 0
+    shift = 0
+    while True:
+        if pos >= len(buf):
+            raise DecodeError("truncated varint")
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+        if shift >= 64:
+            raise DecodeError("varint too long")
+
+def write_tag(out, number, wire_type):
+    write_varint(out, (number << 3) | wire_type)
+
+def write_bytes(out, number, data):
+    write_tag(out, number, WIRE_LENGTH)
+    write_varint(out, len(data))
+    out += data
+
+def skip_field(buf, pos, wire_type):
+    if wire_type == WIRE_VARINT:
+        _, pos = read_varint(buf, pos)
+    elif wire_type == WIRE_FIXED64:
+        pos += 8
+    elif wire_type == WIRE_LENGTH:
+        length, pos = read_varint(buf, pos)
+        pos += length
+    elif wire_type == WIRE_FIXED32:
+        pos += 4
+    else:
+        raise DecodeError("unsupported wire type {}".format(wire_type))
+    if pos > len(buf):
+        raise DecodeError("truncated field")
+    return pos
+
+def read_length(buf, pos):
+    length, pos = read_varint(buf, pos)
+    end = pos + length
+    if end > len(buf):
+        raise DecodeError("truncated length delimited field")
+    return pos, end
+
+def encode_scalar(type, value):
+    if type == "sint32":
+        return zigzag_encode(int(value))
+    if type == "bool":
+        return 1 if value else 0
+    return int(value)
+
+def decode_scalar(type, value):
+    if type == "sint32":
+        return zigzag_decode(value)
+    if type == "bool":
+        return value != 0
+    return value & 0xffffffff
+
+def default_value(type):
+    if type == "string":
+        return ""
+    if type == "bytes":
+        return b""
+    if type == "bool":
+        return False
+    return 0
+
+def write_value(out, number, type, value):
+    if type in SCALARS:
+        write_tag(out, number, WIRE_VARINT)
+        write_varint(out, encode_scalar(type, value))
+    elif type == "string":
+        write_bytes(out, number, value.encode("utf-8"))
+    elif type == "bytes":
+        write_bytes(out, number, value)
+    else:
+        write_bytes(out, number, encode(type, value))
+
+def encode(message_type, message, out=None):
+    if out is None:
+        out = bytearray()
+
+    for number, name, type, label in SCHEMA[message_type]:
+        value = message.get(name)
+
+        if value is None:
+            continue
+
+        if isinstance(type, tuple):
+            _, key_type, value_type = type
+            for key in sorted(value):
+                entry = bytearray()
+                write_value(entry, 1, key_type, key)
+                write_value(entry, 2, value_type, value[key])
+                write_bytes(out, number, entry)
+        elif label == REPEATED:
+            if type in SCALARS:
+                # proto3 packs repeated scalars by default
+                if len(value) == 0:
+                    continue
+                packed = bytearray()
+                for item in value:
+                    write_varint(packed, encode_scalar(type, item))
+                write_bytes(out, number, packed)
+            else:
+                for item in value:
+                    write_value(out, number, type, item)
+        elif label == OPTIONAL or value != default_value(type):
+            write_value(out, number, type, value)
+
+    return bytes(out)
+
+def read_value(buf, pos, wire_type, type):
+    if type in SCALARS:
+        if wire_type != WIRE_VARINT:
+            raise DecodeError("expected varint for {}".format(type))
+        value, pos = read_varint(buf, pos)
+        return decode_scalar(type, value), pos
+    if wire_type != WIRE_LENGTH:
+        raise DecodeError("expected length delimited field for {}".format(type))
+    start, end = read_length(buf, pos)
+    if type == "string":
+        return bytes(buf[start:end]).decode("utf-8"), end
+    if type == "bytes":
+        return bytes(buf[start:end]), end
+    return decode(type, buf, start, end), end
+
+def decode(message_type, buf, pos=0, end=None):
+    if end is None:
+        end = len(buf)
+
+    fields = {}
+    message = {}
+
+    for number, name, type, label in SCHEMA[message_type]:
+        fields[number] = (name, type, label)
+        if isinstance(type, tuple) or label == REPEATED:
+            message[name] = {} if isinstance(type, tuple) else []
+        elif label != OPTIONAL:
+            message[name] = default_value(type)
+
+    while pos < end:
+        key, pos = read_varint(buf, pos)
+        number = key >> 3
+        wire_type = key & 7
+        field = fields.get(number)
+
+        if field is None:
+            pos = skip_field(buf, pos, wire_type)
+            continue
+
+        name, type, label = field
+
+        if isinstance(type, tuple):
+            _, key_type, value_type = type
+            start, pos = read_length(buf, pos)
+            entry_key = default_value(key_type)
+            entry_value = default_value(value_type) if value_type in SCALARS else decode(value_type, b"")
+            while start < pos:
+                entry_tag, start = read_varint(buf, start)
+                if entry_tag >> 3 == 1:
+                    entry_key, start = read_value(buf, start, entry_tag & 7, key_type)
+                elif entry_tag >> 3 == 2:
+                    entry_value, start = read_value(buf, start, entry_tag & 7, value_type)
+                else:
+                    start = skip_field(buf, start, entry_tag & 7)
+            message[name][entry_key] = entry_value
+        elif label == REPEATED and type in SCALARS and wire_type == WIRE_LENGTH:
+            start, pos = read_length(buf, pos)
+            values = message[name]
+            while start < pos:
+                value, start = read_varint(buf, start)
+                values.append(decode_scalar(type, value))
+        elif label == REPEATED:
+            value, pos = read_value(buf, pos, wire_type, type)
+            message[name].append(value)
+        else:
+            message[name], pos = read_value(buf, pos, wire_type, type)
+
+    if pos != end:
+        raise DecodeError("message overran its length")
+
+    return message
+
+# The mesh is the bulk of our data, so it gets a dedicated codec that works
+# on whole columns with numpy. Vertex, Face and TextureFace only have varint
+# fields, which makes an encoded Mesh a flat run of varints: a (tag, length)
+# header for every record followed by the (tag, value) pairs of its fields.
+
+# (tag of the record in Mesh, number of fields) of Vertex, Face and TextureFace
+MESH_RECORDS = (
+    (0x0a, 4),
+    (0x12, 8),
+    (0x1a, 3),
+)
+
+def varint_lengths(values):
+    lengths = np.ones(len(values), dtype=np.int64)
+    for shift in range(7, 64, 7):
+        longer = values >= np.uint64(1 << shift)
+        if not longer.any():
+            break
+        lengths += longer
+    return lengths
+
+def encode_varints(values):
+    lengths = varint_lengths(values)
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    out = np.empty(int(ends[-1]) if len(ends) else 0, dtype=np.uint8)
+
+    # most values fit in one byte, later bytes only go over the longer ones
+    selected = np.arange(len(values))
+    index = 0
+
+    while len(selected):
+        byte = (values[selected] >> np.uint64(7 * index)) & np.uint64(0x7f)
+        more = lengths[selected] > index + 1
+        out[starts[selected] + index] = byte.astype(np.uint8) | (more.astype(np.uint8) << 7)
+        selected = selected[more]
+        index += 1
+
+    return out.tobytes()
+
+# (values, starts, ends) of a buffer that is nothing but varints
+def decode_varints(octets):
+    ends = np.flatnonzero(octets < 0x80)
+    starts = np.zeros(len(ends), dtype=np.int64)
+    starts[1:] = ends[:-1] + 1
+    lengths = ends - starts + 1
+
+    if len(lengths) and lengths.max() > 10:
+        raise DecodeError("varint too long")
+
+    shifts = (np.arange(len(octets)) - np.repeat(starts, lengths)).astype(np.uint64) * np.uint64(7)
+    parts = (octets & 0x7f).astype(np.uint64) << shifts
+    values = np.bitwise_or.reduceat(parts, starts) if len(starts) else np.zeros(0, dtype=np.uint64)
+
+    return values, starts, ends
+
+def as_uint32(values):
+    return np.asarray(values, dtype=np.int64).astype(np.uint64) & np.uint64(0xffffffff)
+
+def as_sint32(values):
+    values = np.asarray(values, dtype=np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64) & np.uint64(0xffffffff)
+
+def encode_mesh(mesh):
+    records = (
+        np.column_stack((as_sint32(mesh.vertices), as_uint32(mesh.vertex_label))),
+        np.column_stack((
+            as_uint32(mesh.faces),
+            as_uint32(mesh.face_label),
+            as_uint32(mesh.face_color),
+            as_uint32(mesh.face_alpha),
+            as_uint32((mesh.face_type & 1) == 0),
+        )),
+        as_uint32(mesh.texture_faces),
+    )
+
+    tokens = []
+
+    for (tag, _), fields in zip(MESH_RECORDS, records):
+        count = fields.shape[1]
+        present = fields != 0
+
+        # fields equal to their default are left out, every key is one byte
+        header = np.empty((len(fields), 2), dtype=np.uint64)
+        header[:, 0] = tag
+        header[:, 1] = (present * (1 + varint_lengths(fields.ravel()).reshape(fields.shape))).sum(axis=1)
+
+        pairs = np.empty((len(fields), count, 2), dtype=np.uint64)
+        pairs[:, :, 0] = np.arange(1, count + 1, dtype=np.uint64) << np.uint64(3)
+        pairs[:, :, 1] = fields
+
+        values = np.concatenate((header, pairs.reshape(len(fields), 2 * count)), axis=1)
+        mask = np.concatenate((np.ones((len(fields), 2), dtype=bool), np.repeat(present, 2, axis=1)), axis=1)
+        tokens.append(values[mask])
+
+    return encode_varints(np.concatenate(tokens))
+
+# Reads the varint fields of the records of a Mesh into one table per record
+# type, or returns None for anything that isn't a flat run of varints.
+def decode_mesh_tables(buf):
+    octets = np.frombuffer(buf, dtype=np.uint8)
+
+    if len(octets) == 0:
+        return [np.zeros((0, count), dtype=np.uint64) for _, count in MESH_RECORDS]
+    if octets[-1] >= 0x80:
+        return None
+
+    values, starts, ends = decode_varints(octets)
+
+    if len(values) % 2:
+        return None
+
+    keys = values[0::2]
+    fields = values[1::2]
+    headers = (keys & np.uint64(7)) == WIRE_LENGTH
+    header_index = np.flatnonzero(headers)
+
+    if not headers[0]:
+        return None
+    if ((keys[~headers] & np.uint64(7)) != WIRE_VARINT).any():
+        return None
+
+    # every record has to end exactly where the next one starts
+    payload_start = ends[1::2][header_index] + 1
+    payload_end = np.append(starts[0::2][header_index[1:]], len(octets))
+    if (payload_end - payload_start != fields[header_index]).any():
+        return None
+
+    owner = np.cumsum(headers) - 1
+    record_tags = keys[header_index]
+    numbers = (keys >> np.uint64(3)).astype(np.int64)
+    tables = []
+
+    for tag, count in MESH_RECORDS:
+        is_type = record_tags == tag
+        rank = np.cumsum(is_type) - 1
+        table = np.zeros((int(is_type.sum()), count), dtype=np.uint64)
+
+        # unknown fields are skipped, repeated ones keep their last value
+        pairs = ~headers & is_type[owner] & (numbers >= 1) & (numbers <= count)
+        table[rank[owner[pairs]], numbers[pairs] - 1] = fields[pairs]
+        tables.append(table)
+
+    return tables
+
+def mesh_from_tables(vertices, faces, texture_faces):
+    zigzag = vertices[:, 0:3]
+    faces = faces & np.uint64(0xffffffff)
+
+    return {
+        "vertices": (zigzag >> np.uint64(1)).astype(np.int64) ^ -(zigzag & np.uint64(1)).astype(np.int64),
+        "vertex_label": (vertices[:, 3] & np.uint64(0xffffffff)).astype(np.int64),
+        "faces": faces[:, 0:3].astype(np.int64),
+        "face_type": np.where(faces[:, 6] != 0, 0, 1),
+        "face_color": faces[:, 4].astype(np.int64),
+        "face_alpha": faces[:, 5].astype(np.int64),
+        "face_label": faces[:, 3].astype(np.int64),
+        "face_layer": np.zeros(len(faces), dtype=np.int64),
+        "texture_faces": (texture_faces & np.uint64(0xffffffff)).astype(np.int64),
+    }
+
+# Meshes from other writers may use field types or layouts the table reader
+# doesn't handle, those go through the generic decoder.
+def mesh_from_message(message):
+    return {
+        "vertices": [[vertex["x"], vertex["y"], vertex["z"]] for vertex in message["vertices"]],
+        "vertex_label": [vertex["label"] for vertex in message["vertices"]],
+        "faces": [[face["a"], face["b"], face["c"]] for face in message["faces"]],
+        "face_type": [0 if face["smooth"] else 1 for face in message["faces"]],
+        "face_color": [face["color"] for face in message["faces"]],
+        "face_alpha": [face["transparency"] for face in message["faces"]],
+        "face_label": [face["label"] for face in message["faces"]],
+        "face_layer": [0] * len(message["faces"]),
+        "texture_faces": [[face["a"], face["b"], face["c"]] for face in message["texture_faces"]],
+    }
+
+def decode_mesh(buf):
+    tables = decode_mesh_tables(buf)
+
+    if tables is None:
+        return mesh_from_message(decode("Mesh", buf))
+
+    return mesh_from_tables(*tables)
+
+# Animation frames are the bulk of an archive and get the same treatment.
+# Bone and group names are written as one token per byte, which only works
+# for ASCII names, anything else takes the generic codec. Frames are encoded
+# in chunks to bound the size of the token matrices.
+
+ANIMATION_CHUNK = 1 << 20
+
+def name_tokens(names):
+    octets = [name.encode("utf-8") for name in names]
+    if any(max(name, default=0) >= 0x80 for name in octets):
+        return None, None
+    width = max(map(len, octets), default=0)
+    tokens = np.zeros((len(octets), width), dtype=np.uint64)
+    for index, name in enumerate(octets):
+        tokens[index, :len(name)] = np.frombuffer(name, dtype=np.uint8)
+    return tokens, np.array([len(name) for name in octets], dtype=np.int64)
+
+# Length of every (tag, length, payload) field, none where present is false.
+def field_lengths(present, lengths):
+    return present * (1 + varint_lengths(lengths.ravel()).reshape(lengths.shape) + lengths)
+
+# Tokens of the transform entries of a chunk of frames, as a (frame, bone,
+# token) matrix and its mask, with bones in map order.
+def transform_tokens(frames, order, names, name_lengths):
+    transforms = frames.transforms[:, order]
+    present = frames.present[:, order]
+    count, bone_count = present.shape[:2]
+    width = names.shape[1]
+
+    values = as_sint32(transforms)
+    nonzero = values != 0
+    vector_lengths = (nonzero * (1 + varint_lengths(values.ravel()).reshape(values.shape))).sum(axis=3)
+    transform_lengths = field_lengths(present, vector_lengths).sum(axis=2)
+    entry_lengths = 1 + varint_lengths(name_lengths) + name_lengths + 1 + varint_lengths(transform_lengths.ravel()).reshape(transform_lengths.shape) + transform_lengths
+    used = present.any(axis=2)
+
+    tokens = np.empty((count, bone_count, 6 + width + 24), dtype=np.uint64)
+    tokens[:, :, 0] = 0x0a
+    tokens[:, :, 1] = entry_lengths
+    tokens[:, :, 2] = 0x0a
+    tokens[:, :, 3] = name_lengths
+    tokens[:, :, 4:4 + width] = names
+    tokens[:, :, 4 + width] = 0x12
+    tokens[:, :, 5 + width] = transform_lengths
+
+    vectors = tokens[:, :, 6 + width:].reshape(count, bone_count, 3, 8)
+    vectors[:, :, :, 0] = (np.arange(1, 4, dtype=np.uint64) << np.uint64(3)) | np.uint64(WIRE_LENGTH)
+    vectors[:, :, :, 1] = vector_lengths
+    vectors[:, :, :, 2:8:2] = np.arange(1, 4, dtype=np.uint64) << np.uint64(3)
+    vectors[:, :, :, 3:8:2] = values
+
+    mask = np.empty(tokens.shape, dtype=bool)
+    mask[:, :, :4] = used[:, :, None]
+    mask[:, :, 4:4 + width] = used[:, :, None] & (np.arange(width) < name_lengths[:, None])
+    mask[:, :, 4 + width:6 + width] = used[:, :, None]
+
+    vector_mask = mask[:, :, 6 + width:].reshape(count, bone_count, 3, 8)
+    vector_mask[:, :, :, 0:2] = present[:, :, :, None]
+    vector_mask[:, :, :, 2:8:2] = present[:, :, :, None] & nonzero
+    vector_mask[:, :, :, 3:8:2] = vector_mask[:, :, :, 2:8:2]
+
+    return tokens.reshape(count, -1), mask.reshape(count, -1), field_lengths(used, entry_lengths).sum(axis=1)
+
+# Tokens of the alpha entries of a chunk of frames, like transform_tokens.
+def alpha_tokens(frames, order, names, name_lengths):
+    alphas = as_sint32(frames.alphas[:, order])
+    present = frames.alpha_present[:, order]
+    count, group_count = present.shape
+    width = names.shape[1]
+
+    entry_lengths = 1 + varint_lengths(name_lengths) + name_lengths + 1 + varint_lengths(alphas.ravel()).reshape(alphas.shape)
+
+    tokens = np.empty((count, group_count, 6 + width), dtype=np.uint64)
+    tokens[:, :, 0] = 0x12
+    tokens[:, :, 1] = entry_lengths
+    tokens[:, :, 2] = 0x0a
+    tokens[:, :, 3] = name_lengths
+    tokens[:, :, 4:4 + width] = names
+    tokens[:, :, 4 + width] = 0x10
+    tokens[:, :, 5 + width] = alphas
+
+    mask = np.repeat(present[:, :, None], tokens.shape[2], axis=2)
+    mask[:, :, 4:4 + width] &= np.arange(width) < name_lengths[:, None]
+
+    return tokens.reshape(count, -1), mask.reshape(count, -1), field_lengths(present, entry_lengths).sum(axis=1)
+
+# Encodes an AnimationArchive, or returns None for names the fast path can't
+# write.
+def encode_animation(archive):
+    frames = archive.frames
+    bone_order = sorted(range(len(frames.bones)), key=frames.bones.__getitem__)
+    group_order = sorted(range(len(frames.groups)), key=frames.groups.__getitem__)
+    bone_names, bone_lengths = name_tokens([frames.bones[index] for index in bone_order])
+    group_names, group_lengths = name_tokens([frames.groups[index] for index in group_order])
+
+    if bone_names is None or group_names is None:
+        return None
+
+    out = [encode("AnimationArchive", {"animations": {name: animation.to_dict() for name, animation in archive.animations.items()}})]
+    row_size = len(bone_order) * (6 + bone_names.shape[1] + 24) + len(group_order) * (6 + group_names.shape[1]) + 4
+    step = max(1, ANIMATION_CHUNK // row_size)
+
+    for start in range(0, len(frames), step):
+        chunk = frames.take(np.arange(start, min(start + step, len(frames))))
+        transforms, transform_mask, transform_lengths = transform_tokens(chunk, bone_order, bone_names, bone_lengths)
+        alphas, alpha_mask, alpha_lengths = alpha_tokens(chunk, group_order, group_names, group_lengths)
+        durations = as_uint32(chunk.durations)
+        frame_lengths = transform_lengths + alpha_lengths + (durations != 0) * (1 + varint_lengths(durations))
+
+        header = np.empty((len(chunk), 2), dtype=np.uint64)
+        header[:, 0] = 0x12
+        header[:, 1] = frame_lengths
+        trailer = np.empty((len(chunk), 2), dtype=np.uint64)
+        trailer[:, 0] = 0x18
+        trailer[:, 1] = durations
+
+        tokens = np.concatenate((header, transforms, alphas, trailer), axis=1)
+        mask = np.concatenate((
+            np.ones((len(chunk), 2), dtype=bool),
+            transform_mask,
+            alpha_mask,
+            np.repeat((durations != 0)[:, None], 2, axis=1),
+        ), axis=1)
+        out.append(encode_varints(tokens[mask]))
+
+    return b"".join(out)
+
+# Unique names of the name tokens of entries, and the index of every entry's
+# name in them. Names are ASCII by then, every byte was a token of its own.
+def read_names(values, starts, name_lengths):
+    width = int(name_lengths.max(initial=0))
+    index = np.minimum(starts[:, None] + np.arange(width), len(values) - 1)
+    octets = np.where(np.arange(width) < name_lengths[:, None], values[index], 0).astype(np.uint8)
+    rows = np.concatenate((octets, name_lengths.astype("<u4").view(np.uint8).reshape(-1, 4)), axis=1)
+    unique, inverse = np.unique(np.ascontiguousarray(rows).view(np.dtype((np.void, width + 4))).ravel(), return_inverse=True)
+
+    names = []
+    for row in unique:
+        row = row.tobytes()
+        names.append(row[:int.from_bytes(row[width:], "little")].decode("ascii"))
+
+    return names, inverse.ravel()
+
+# Reads the frames of an AnimationArchive into the columns of
+# data.AnimationFrames, next to the rest of the archive decoded as usual.
+# Returns None for anything not laid out the way encode_animation writes.
+def decode_animation_tables(buf):
+    buf = bytes(buf)
+    animations = bytearray()
+    frame_keys = []
+    frame_starts = []
+    frame_ends = []
+    pos = 0
+
+    # the top level has a field per animation and frame, few enough to walk
+    while pos < len(buf):
+        start = pos
+        key, pos = read_varint(buf, pos)
+        if key == 0x0a and not frame_starts:
+            _, pos = read_length(buf, pos)
+            animations += buf[start:pos]
+        elif key == 0x12:
+            payload, pos = read_length(buf, pos)
+            frame_keys.append(start)
+            frame_starts.append(payload)
+            frame_ends.append(pos)
+        else:
+            return None
+
+    message = decode("AnimationArchive", bytes(animations))
+    columns = {"bones": [], "groups": [], "durations": np.zeros(len(frame_starts), dtype=np.int32)}
+
+    if not frame_starts:
+        return message, columns
+
+    # everything from the first frame on is varints and single byte names
+    base = frame_keys[0]
+    octets = np.frombuffer(buf, dtype=np.uint8)[base:]
+    if octets[-1] >= 0x80:
+        return None
+
+    values, starts, ends = decode_varints(octets)
+    token_at = np.full(len(octets) + 1, -1, dtype=np.int64)
+    token_at[starts] = np.arange(len(starts))
+    token_at[len(octets)] = len(starts)
+    byte_at = np.append(starts, len(octets))
+
+    frame_begin = token_at[np.array(frame_starts) - base]
+    frame_end = token_at[np.array(frame_ends) - base]
+    if (frame_begin < 0).any() or (frame_end < 0).any():
+        return None
+
+    # walks the fields of all frames at once, one field of each per step
+    empty = np.zeros(0, dtype=np.int64)
+    transform_entries = [(empty, empty, empty)]
+    alpha_entries = [(empty, empty, empty)]
+    cursor = frame_begin.copy()
+    active = np.flatnonzero(cursor < frame_end)
+
+    while len(active):
+        field = cursor[active]
+        if (field + 2 > frame_end[active]).any():
+            return None
+
+        key = values[field]
+        value = values[field + 1]
+        is_length = (key == 0x0a) | (key == 0x12)
+        is_duration = key == 0x18
+
+        if not (is_length | is_duration).all():
+            return None
+
+        end = ends[field + 1] + 1 + np.minimum(value, np.uint64(len(octets))).astype(np.int64)
+        if (is_length & (end > byte_at[frame_end[active]])).any():
+            return None
+
+        following = np.where(is_length, token_at[np.minimum(end, len(octets))], field + 2)
+        if (following < 0).any():
+            return None
+
+        for tag, entries in ((0x0a, transform_entries), (0x12, alpha_entries)):
+            selected = key == tag
+            entries.append((field[selected], following[selected], active[selected]))
+
+        columns["durations"][active[is_duration]] = value[is_duration] & np.uint64(0xffffffff)
+        cursor[active] = following
+        active = active[following < frame_end[active]]
+
+    transforms = read_transform_entries(values, starts, ends, byte_at, *map(np.concatenate, zip(*transform_entries)), len(frame_starts))
+    alphas = read_alpha_entries(values, *map(np.concatenate, zip(*alpha_entries)), len(frame_starts))
+
+    if transforms is None or alphas is None:
+        return None
+
+    columns["bones"], columns["transforms"], columns["present"] = transforms
+    columns["groups"], columns["alphas"], columns["alpha_present"] = alphas
+
+    return message, columns
+
+# (name length, first name token) of the key of every map entry starting at
+# the given tokens, or None unless the key comes first and is a plain name.
+def read_entry_keys(values, entries, entry_ends):
+    if (entries + 4 > entry_ends).any() or (values[entries + 2] != 0x0a).any():
+        return None
+    name_lengths = np.minimum(values[entries + 3], np.uint64(1 << 32)).astype(np.int64)
+    if (entries + 6 + name_lengths > entry_ends).any():
+        return None
+    return name_lengths, entries + 4
+
+def read_transform_entries(values, starts, ends, byte_at, entries, entry_ends, frame_of, frame_count):
+    keys = read_entry_keys(values, entries, entry_ends)
+    if keys is None:
+        return None
+    name_lengths, name_starts = keys
+
+    # names are single byte tokens, the value follows right after them
+    value_tokens = name_starts + name_lengths
+    if (byte_at[value_tokens] - byte_at[name_starts] != name_lengths).any() or (values[value_tokens] != 0x12).any():
+        return None
+    if (ends[value_tokens + 1] + 1 + values[value_tokens + 1].astype(np.int64) != byte_at[entry_ends]).any():
+        return None
+
+    bones, bone_of = read_names(values, name_starts, name_lengths)
+    order = sorted(range(len(bones)), key=bones.__getitem__)
+    rank = np.empty(len(bones), dtype=np.int64)
+    rank[order] = np.arange(len(bones))
+    bone_of = rank[bone_of]
+
+    # the AnimationTransform payloads are (key, value) pairs: a header per
+    # Vector followed by its components
+    first = value_tokens + 2
+    counts = entry_ends - first
+    if (counts % 2).any() or (counts < 0).any():
+        return None
+    offsets = np.cumsum(counts) - counts
+    tokens = np.arange(int(counts.sum())) - np.repeat(offsets, counts) + np.repeat(first, counts)
+    owner = np.repeat(np.arange(len(entries)), counts)[0::2]
+
+    keys = values[tokens[0::2]]
+    fields = values[tokens[1::2]]
+    numbers = (keys >> np.uint64(3)).astype(np.int64)
+    headers = (keys & np.uint64(7)) == WIRE_LENGTH
+    header_index = np.flatnonzero(headers)
+
+    if ((numbers < 1) | (numbers > 3)).any() or ((keys[~headers] & np.uint64(7)) != WIRE_VARINT).any():
+        return None
+
+    # every entry starts with a header and every Vector ends where the next
+    # header or its entry does
+    starts_entry = np.ones(len(owner), dtype=bool)
+    starts_entry[1:] = owner[1:] != owner[:-1]
+    if (starts_entry & ~headers).any():
+        return None
+    header_tokens = tokens[0::2][header_index]
+    header_owner = owner[header_index]
+    vector_end = byte_at[entry_ends[header_owner]]
+    followed = header_owner[1:] == header_owner[:-1]
+    vector_end[:-1][followed] = byte_at[header_tokens[1:][followed]]
+    if (ends[tokens[1::2][header_index]] + 1 + fields[header_index].astype(np.int64) != vector_end).any():
+        return None
+
+    header_of = np.cumsum(headers) - 1
+    field_of = numbers[header_index] - 1
+
+    transforms = np.zeros((frame_count, len(bones), 3, 3), dtype=np.int32)
+    present = np.zeros((frame_count, len(bones), 3), dtype=bool)
+    present[frame_of[owner[header_index]], bone_of[owner[header_index]], field_of] = True
+
+    components = ~headers
+    zigzag = fields[components] & np.uint64(0xffffffff)
+    transforms[
+        frame_of[owner[components]],
+        bone_of[owner[components]],
+        field_of[header_of[components]],
+        numbers[components] - 1,
+    ] = (zigzag >> np.uint64(1)).astype(np.int64) ^ -(zigzag & np.uint64(1)).astype(np.int64)
+
+    return sorted(bones), transforms, present
+
+def read_alpha_entries(values, entries, entry_ends, frame_of, frame_count):
+    keys = read_entry_keys(values, entries, entry_ends)
+    if keys is None:
+        return None
+    name_lengths, name_starts = keys
+
+    # the key is followed by the value as the last field of the entry
+    value_tokens = name_starts + name_lengths
+    if (value_tokens + 2 != entry_ends).any() or (values[value_tokens] != 0x10).any():
+        return None
+
+    groups, group_of = read_names(values, name_starts, name_lengths)
+    order = sorted(range(len(groups)), key=groups.__getitem__)
+    rank = np.empty(len(groups), dtype=np.int64)
+    rank[order] = np.arange(len(groups))
+
+    zigzag = values[value_tokens + 1] & np.uint64(0xffffffff)
+    alphas = np.zeros((frame_count, len(groups)), dtype=np.int32)
+    alpha_present = np.zeros((frame_count, len(groups)), dtype=bool)
+    alphas[frame_of, rank[group_of]] = (zigzag >> np.uint64(1)).astype(np.int64) ^ -(zigzag & np.uint64(1)).astype(np.int64)
+    alpha_present[frame_of, rank[group_of]] = True
+
+    return sorted(groups), alphas, alpha_present
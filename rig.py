@@ -1,12 +1,7 @@
-
-import os
 import bpy
-import json
-import math
 
-from . import model, util
+from . import model, util, data, codec, profiling, background
 
-from collections import deque
 from mathutils import Vector
 from bpy.types import Operator, Panel, UIList, PropertyGroup
 from bpy.props import StringProperty, BoolProperty, FloatProperty, EnumProperty
@@ -37,6 +32,16 @@ class RS_OT_ImportRig(Operator, ImportHelper):
     )
 
     attach_object: EnumProperty(name="Attach to", items=get_objects)
+
+    mode: EnumProperty(
+        name="Format",
+        items=(
+            ('AUTO', "Auto", "Detect the format from the file contents"),
+            ('BINARY', "Binary", "Protobuf encoded rig"),
+            ('JSON', "JSON", "JSON encoded rig"),
+        ),
+        default='AUTO',
+    )
     
     clear_vertex_groups: BoolProperty(
         name="Clear Vertex Groups",
@@ -45,30 +50,29 @@ class RS_OT_ImportRig(Operator, ImportHelper):
     )
     
     def execute(self, context):
-        return Import(context, self.filepath,
+        return profiling.profile(context, "Import rig", lambda: Import(context, self.filepath,
             obj_name = self.attach_object,
             clear_vertex_groups = self.clear_vertex_groups,
-        )
-
-def Import(context, filepath, obj_name=None, clear_vertex_groups=False):
-    with open(filepath, "r") as file:
-        data = json.load(file)
-
-    if not data:
-        print("no data")
+            mode = self.mode,
+        ), self.report)
+
+def Import(context, filepath, obj_name=None, clear_vertex_groups=False, mode='AUTO'):
+    try:
+        with profiling.span("read"):
+            with open(filepath, "rb") as file:
+                buffer = file.read()
+        with profiling.span("decode"):
+            rig = codec.decode_rig(buffer, mode)
+    except (OSError, ValueError) as error:
+        print("Unable to read", filepath, error)
         return {'CANCELLED'}
 
-    if "bones" not in data:
+    if len(rig) == 0:
         print("no bone data")
         return {'CANCELLED'}
-
-    data_bones = data["bones"]
     
     if obj_name:
-        for other in context.scene.objects:
-            if other.name == obj_name:
-                obj = other
-                break
+        obj = context.scene.objects.get(obj_name)
     else:
         obj = context.active_object
     
@@ -76,90 +80,94 @@ def Import(context, filepath, obj_name=None, clear_vertex_groups=False):
         print("no object found")
         return {'CANCELLED'}
 
-    label_vertices = model.get_label_vertices(obj.data)
- 
-    obj.select_set(state=True)
-    bpy.ops.object.mode_set(mode='OBJECT')
-    bpy.ops.object.armature_add()
+    # a mesh in edit mode would overwrite the vertex groups we add once it leaves it
+    if obj.mode != 'OBJECT':
+        with context.temp_override(active_object=obj, object=obj):
+            bpy.ops.object.mode_set(mode='OBJECT')
+
+    with profiling.span("label index"):
+        label_index = model.get_label_index(obj.data)
+
+    armature = bpy.data.armatures.new(obj.name)
+    armature["imported"] = True
 
-    armature_obj = context.active_object
-    armature_obj.name = obj_name
+    armature_obj = bpy.data.objects.new(obj.name, armature)
     armature_obj.show_in_front = True
     armature_obj.parent = obj
 
-    armature = armature_obj.data
-    armature["imported"] = True
+    for collection in obj.users_collection or [context.scene.collection]:
+        collection.objects.link(armature_obj)
 
-    bpy.ops.object.mode_set(mode='EDIT')
     model.create_or_update_armature_modifier(obj, armature_obj)
-    
-    edit_bones = armature.edit_bones
 
     if clear_vertex_groups:
-        for group in obj.vertex_groups:
-            obj.vertex_groups.remove(group)
+        obj.vertex_groups.clear()
+
+    # edit bones only exist in edit mode, so enter it once on the new armature
+    # without touching the active object or selection
+    with context.temp_override(active_object=armature_obj, object=armature_obj, edit_object=armature_obj):
+        bpy.ops.object.mode_set(mode='EDIT')
+        with profiling.span("bones"):
+            create_bones(obj, armature.edit_bones, rig, label_index)
+        bpy.ops.object.mode_set(mode='OBJECT')
+
+    return {'FINISHED'}
+
+def create_bones(obj, edit_bones, rig, label_index):
+    created_bones = {}
+    rotates = {}
 
     # create bones, vertex groups, and set bone head.
-    for data_bone in data_bones:
-        has_origin_labels = False
-
-        for label in data_bone["origins"]:
-            if label in label_vertices:
-                has_origin_labels = True
-                break
-
-        bone_name = data_bone["name"]
-        
-        if not has_origin_labels:
-            data_bone["skipped"] = True
+    for index, bone_name in enumerate(rig.names):
+        origins = rig.get_origin_labels(index)
+
+        if not any(label in label_index for label in origins):
             print("Bone", bone_name, "skipped due to missing origin labels")
             continue
 
-        # create bone and link to data temporarily for future ref
         edit_bone = edit_bones.new(bone_name)
-        data_bone["edit_bone"] = edit_bone
+        created_bones[bone_name] = edit_bone
+        rotates[bone_name] = rig.get_labels(index)
 
         # store origin and transform labels in new bone
-        edit_bone["origin_labels"] = data_bone["origins"]
-        edit_bone["transform_labels"] = data_bone["rotates"]
+        edit_bone["origin_labels"] = origins
+        edit_bone["transform_labels"] = rotates[bone_name]
 
         vertex_group = obj.vertex_groups.get(bone_name)
 
         if vertex_group is None:
             vertex_group = obj.vertex_groups.new(name=bone_name)
 
-        for label in data_bone["rotates"]:
-            if label not in label_vertices:
-                continue
-            for vertex in label_vertices[label]:
-                vertex_group.add([vertex.index], 1.0, 'REPLACE')
+        indices = label_index.get_vertices(rotates[bone_name])
+        if len(indices) > 0:
+            vertex_group.add(indices.tolist(), 1.0, 'REPLACE')
 
-        edit_bone.head = model.get_label_median(label_vertices, data_bone["origins"])
+        edit_bone.head = Vector(label_index.get_centroid(origins))
         edit_bone.tail = edit_bone.head + Vector((0,10,0))
 
+    parents = []
+    root = {}
+
     # assign parents
-    for data_bone in data_bones:
-        if "skipped" in data_bone:
+    for index, bone_name in enumerate(rig.names):
+        if bone_name not in created_bones:
             continue
-        if data_bone["name"] == "ROOT":
+        root[bone_name] = rig.root[index]
+        parent_name = rig.parents[index] or ""
+        if bone_name == "ROOT" or parent_name not in created_bones:
+            parents.append((bone_name, None))
             continue
-        edit_bone = data_bone["edit_bone"]
-        parent_name = data_bone["parent"] or ""
-        if parent_name in edit_bones:
-            edit_bone.parent = edit_bones[parent_name]
+        created_bones[bone_name].parent = created_bones[parent_name]
+        parents.append((bone_name, parent_name))
 
-    # reposition bone if needed based on relationships
-    for data_bone in data_bones:
-        if "skipped" in data_bone:
-            continue
-        
-        bone_name = data_bone["name"]
+    topology = data.RigTopology(parents)
 
+    # reposition bone if needed based on relationships
+    for bone_name, edit_bone in created_bones.items():
         if bone_name == "ROOT":
             continue
 
-        edit_bone = data_bone["edit_bone"]
-        children = [child for child in armature.edit_bones if child.parent == edit_bone]
+        children = [created_bones[name] for name in topology.children[bone_name]]
 
         # one child, so we probably are just a part of a chain. connect to them
         if len(children) == 1:
@@ -169,10 +177,10 @@ def Import(context, filepath, obj_name=None, clear_vertex_groups=False):
                 child.use_connect = True
         else: # zero children or more than 1
             # skip any bones marked as root...
-            if "root" in data_bone and data_bone["root"] == True:
+            if root[bone_name]:
                 continue
 
-            label_center = model.get_label_median(label_vertices, data_bone["rotates"])
+            label_center = Vector(label_index.get_centroid(rotates[bone_name]))
 
             # no children, so just place the bone head 25% further than its influenced
             # labels center
@@ -199,10 +207,8 @@ def Import(context, filepath, obj_name=None, clear_vertex_groups=False):
                 edit_bone.tail = edit_bone.head + Vector((0, 0, +20))
                 print(edit_bone, "ended up in an awkward position")
 
-    bpy.ops.object.mode_set(mode='OBJECT')
-    return {'FINISHED'}    
 
-class RS_OT_ExportRig(Operator, ExportHelper):
+class RS_OT_ExportRig(background.BackgroundExport, Operator, ExportHelper):
     """Exports the active armatures rig"""
 
     bl_idname = "rs.export_rig"
@@ -215,83 +221,116 @@ class RS_OT_ExportRig(Operator, ExportHelper):
         maxlen=255,
     )
 
+    mode: EnumProperty(
+        name="Format",
+        items=(
+            ('JSON', "JSON", "JSON encoded rig"),
+            ('BINARY', "Binary", "Protobuf encoded rig"),
+        ),
+        default='JSON',
+    )
+
     def execute(self, context):
-        return Export(context, self.filepath)
+        if not self.runs_in_background():
+            return profiling.profile(context, "Export rig", lambda: Export(context, self.filepath, self.mode), self.report)
 
-def Export(context, filepath):
+        rig = self.take_snapshot(context, "Export rig", lambda: export_rig(context))
+
+        if rig is None:
+            return {'CANCELLED'}
+
+        filepath, mode = self.filepath, self.mode
+        return self.start_job(context, "Exporting rig", lambda step: write_rig(filepath, rig, mode, step))
+
+def Export(context, filepath, mode='JSON'):
+    rig = export_rig(context)
+
+    if rig is None:
+        return {'CANCELLED'}
+
+    write_rig(filepath, rig, mode)
+
+    return {'FINISHED'}
+
+# Only touches the rig, so this is safe to run off the main thread.
+def write_rig(filepath, rig, mode='JSON', step=None):
+    step = step or (lambda phase, progress: None)
+
+    step("encode", 0.0)
+    with profiling.span("encode"):
+        buffer = codec.encode_rig(rig, mode)
+
+    step("write", 0.8)
+    with profiling.span("write"):
+        util.write_atomic(filepath, buffer)
+
+# The rig of the active armature, or of the armature of the active mesh.
+# Bones without an id get the lowest free one, stored on the bone.
+def export_rig(context):
     obj = context.active_object
 
     if obj is None:
-        return {'CANCELLED'}
+        return None
 
     if obj.type != 'ARMATURE':
         obj = obj.find_armature()
 
-    if obj.type != 'ARMATURE':
+    if obj is None or obj.type != 'ARMATURE':
         print("no armature found")
-        return {'CANCELLED'}
+        return None
 
     armature = obj.data
-    
-    data = {
-        "vertex_groups":[],
-        "face_groups":[],
-    }
-
-    bones = bones_sorted_by_depth(obj)
 
-    assigned_ids = {}
-    
-    for bone in bones:
-        if "id" not in bone:
-            for id in range(0, 255):
-                if id not in assigned_ids:
-                    bone["id"] = id
-                    break
-
-        id = bone["id"]
-        assigned_ids[id] = True
-        
-        if "origin_labels" not in bone:
-            bone["origin_labels"] = [255-id]
-        if "transform_labels" not in bone:
-            bone["transform_labels"] = [id]
-
-        group = {
-            "name": "{}".format(bone.name),
-            "origin_labels": util.export_array(bone["origin_labels"]),
-            "labels": util.export_array(bone["transform_labels"]),
-            "children": [child.name for child in bones if child.parent == bone],
-        }
-
-        if bone.inherit_scale == 'FULL':
-            group["inherit_scale"] = True
-
-        data["vertex_groups"].append(group)
-    
-    print(data)
-    with open(filepath, "w") as file:
-        json.dump(data, file)
+    with profiling.span("gather"):
+        bones = {bone.name: bone for bone in armature.bones}
+        topology = data.RigTopology.from_bones(armature.bones)
+
+        # bones keep the ids they already have, new bones get the lowest free ones
+        for bone in bones.values():
+            if "id" in bone:
+                topology.reserve_id(bone["id"])
+
+        names = topology.depth_order()
+        origin_labels = []
+        labels = []
+
+        for bone_name in names:
+            bone = bones[bone_name]
+
+            if "id" not in bone:
+                id = topology.allocate_id()
+                if id is None:
+                    print("no free bone id for", bone_name)
+                    return None
+                bone["id"] = id
+
+            id = bone["id"]
+
+            if "origin_labels" not in bone:
+                bone["origin_labels"] = [255-id]
+            if "transform_labels" not in bone:
+                bone["transform_labels"] = [id]
+
+            origin_labels.append(util.export_array(bone["origin_labels"]))
+            labels.append(util.export_array(bone["transform_labels"]))
+
+        rig = data.Rig(
+            names=names,
+            parents=[topology.parents[name] for name in names],
+            inherit_scale=[bones[name].inherit_scale == 'FULL' for name in names],
+            origin_labels=origin_labels,
+            labels=labels,
+        )
 
-    return {'FINISHED'} 
+    return rig
 
 def bones_sorted_by_depth(armature_obj):
     if not armature_obj or armature_obj.type != 'ARMATURE':
         return []
 
-    # Get the root bones
-    root_bones = [bone for bone in armature_obj.data.bones if not bone.parent]
-
-    # Perform BFS to sort bones by depth
-    sorted_bones = []
-    queue = deque(root_bones)
-    while queue:
-        bone = queue.popleft()
-        sorted_bones.append(bone)
-        queue.extend(bone.children)
-
-    return sorted_bones
-
+    bones = {bone.name: bone for bone in armature_obj.data.bones}
+    topology = data.RigTopology.from_bones(armature_obj.data.bones)
+    return [bones[name] for name in topology.depth_order()]
 
 __classes__ = (
     RS_OT_ExportRig,
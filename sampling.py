@@ -0,0 +1,160 @@
+# The bpy-free half of the animation export: sampled actions are quantized,
+# optionally reduced, and interned into the frame table of an archive. Only
+# the sampling in animation.py touches blender data.
+
+import hashlib
+import numpy as np
+
+from . import util, data
+
+# channel -> AnimationTransform field and its quantization
+CHANNEL_TRANSFORMS = {
+    "rotation_euler": ("rotate", util.export_eulers),
+    "location": ("translate", util.export_vectors),
+    "scale": ("scale", util.export_scales),
+}
+
+# The pose channels of an action evaluated at each of its frames, channels
+# maps (bone name, channel) to a (frame, axis) array of blender values.
+class ActionSamples:
+    __slots__ = ("name", "frames", "durations", "channels")
+
+    def __init__(self, name, frames, durations, channels):
+        self.name = name
+        self.frames = frames
+        self.durations = durations
+        self.channels = channels
+
+def quantize_channels(samples):
+    return {
+        (bone_name, channel): CHANNEL_TRANSFORMS[channel][1](values)
+        for (bone_name, channel), values in samples.channels.items()
+    }
+
+# Frame table of the samples over the given bones. Durations live on the
+# frame refs so that frames only describe a pose.
+def quantize_frames(samples, bones):
+    bone_index = {bone_name: index for index, bone_name in enumerate(bones)}
+    frames = data.AnimationFrames(
+        bones=bones,
+        transforms=np.zeros((len(samples.frames), len(bones), len(data.TRANSFORM_FIELDS), 3), dtype=np.int32),
+    )
+
+    for (bone_name, channel), values in quantize_channels(samples).items():
+        field = data.TRANSFORM_FIELDS.index(CHANNEL_TRANSFORMS[channel][0])
+        frames.transforms[:, bone_index[bone_name], field] = values
+        frames.present[:, bone_index[bone_name], field] = True
+
+    return frames
+
+def wrap_angles(angles):
+    return np.mod(angles + 1024, 2048) - 1024
+
+# Errors, in exported units, of the frames between first and last when they
+# are interpolated linearly from those two. Rotations wrap at 2048.
+def interpolation_errors(times, values, rotations, first, last):
+    t = (times[first + 1:last] - times[first]) / (times[last] - times[first])
+
+    delta = values[last] - values[first]
+    delta[rotations] = wrap_angles(delta[rotations])
+
+    error = values[first] + t[:, None] * delta - values[first + 1:last]
+    error[:, rotations] = wrap_angles(error[:, rotations])
+
+    return np.abs(error).max(axis=1, initial=0.0)
+
+# Drops the frames that can be reconstructed from their kept neighbours
+# within tolerance. The first and last frames are always kept and a kept
+# frame absorbs the durations of the frames dropped after it. Returns the
+# reduced samples and the largest error of any dropped frame.
+def reduce_samples(samples, tolerance):
+    count = len(samples.frames)
+
+    if count <= 2:
+        return samples, 0.0
+
+    quantized = quantize_channels(samples)
+    keys = sorted(quantized)
+
+    if not keys:
+        values = np.zeros((count, 0), dtype=np.float64)
+    else:
+        values = np.concatenate([quantized[key] for key in keys], axis=1).astype(np.float64)
+    rotations = np.repeat([channel == "rotation_euler" for _, channel in keys], 3).astype(bool)
+    times = samples.frames.astype(np.float64)
+
+    # Douglas-Peucker: a span is dropped whole when all of its frames are
+    # within tolerance of its ends, otherwise it is split at its worst frame
+    keep = np.zeros(count, dtype=bool)
+    keep[[0, count - 1]] = True
+    spans = [(0, count - 1)]
+    error = 0.0
+
+    while spans:
+        first, last = spans.pop()
+        if last - first < 2:
+            continue
+
+        errors = interpolation_errors(times, values, rotations, first, last)
+        worst = int(errors.argmax())
+
+        if errors[worst] <= tolerance:
+            error = max(error, float(errors[worst]))
+            continue
+
+        middle = first + 1 + worst
+        keep[middle] = True
+        spans.append((first, middle))
+        spans.append((middle, last))
+
+    kept = np.flatnonzero(keep)
+    frames = samples.frames[kept]
+    end = samples.frames[-1] + samples.durations[-1]
+    durations = np.diff(np.append(frames, end)).astype(np.int32)
+    channels = {key: channel_values[kept] for key, channel_values in samples.channels.items()}
+
+    return ActionSamples(samples.name, frames, durations, channels), error
+
+# Interns identical poses across animations, keyed by a hash of their contents.
+class FrameTable:
+    __slots__ = ("rows", "ids")
+
+    def __init__(self):
+        self.rows = []
+        self.ids = {}
+
+    def intern(self, frames, index):
+        key = hashlib.blake2b(frames.key(index), digest_size=16).digest()
+        frame_id = self.ids.get(key)
+        if frame_id is None:
+            frame_id = len(self.rows)
+            self.ids[key] = frame_id
+            self.rows.append((frames, index))
+        return frame_id
+
+    def to_frames(self, bones):
+        if not self.rows:
+            return data.AnimationFrames(bones=bones)
+        return data.AnimationFrames(
+            bones=bones,
+            transforms=np.stack([frames.transforms[index] for frames, index in self.rows]),
+            present=np.stack([frames.present[index] for frames, index in self.rows]),
+        )
+
+def build_archive(samples_list):
+    bones = sorted({bone_name for samples in samples_list for bone_name, _ in samples.channels})
+    table = FrameTable()
+    animations = {}
+
+    for samples in samples_list:
+        frames = quantize_frames(samples, bones)
+        refs = np.empty((len(frames), 3), dtype=np.int32)
+
+        for index in range(len(frames)):
+            # no secondary pose, both ids refer to the same frame
+            refs[index, 0] = refs[index, 1] = table.intern(frames, index)
+
+        refs[:, 2] = samples.durations
+        animations[samples.name] = data.Animation(frames=refs)
+
+    return data.AnimationArchive(animations=animations, frames=table.to_frames(bones))
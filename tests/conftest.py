@@ -0,0 +1,7 @@
+# The tests cover the bpy-free modules, loaded from this checkout the same
+# way the benchmarks load them, and reuse the benchmark asset generators.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "benchmarks"))
@@ -0,0 +1,63 @@
+import os
+import numpy as np
+import synthetic
+
+cache = synthetic.load_module("cache")
+
+def make_arrays(size):
+    return {"positions": np.arange(size, dtype=np.float32), "labels": np.zeros(4, dtype=np.int32)}
+
+def set_mtime(array_cache, key, mtime):
+    os.utime(array_cache.path(key), (mtime, mtime))
+
+def test_content_key():
+    assert cache.content_key(b"model", "1.0") == cache.content_key(b"model", "1.0")
+    assert cache.content_key(b"model", "1.0") != cache.content_key(b"model", "1.1")
+    assert cache.content_key(b"model", "1.0") != cache.content_key(b"other", "1.0")
+
+def test_store_load(tmp_path):
+    array_cache = cache.ArrayCache(str(tmp_path))
+    arrays = make_arrays(100)
+
+    array_cache.store("key", arrays)
+    loaded = array_cache.load("key")
+
+    assert loaded.keys() == arrays.keys()
+    assert all(np.array_equal(loaded[name], arrays[name]) for name in arrays)
+    assert array_cache.load("missing") is None
+
+def test_broken_entry_is_dropped(tmp_path):
+    array_cache = cache.ArrayCache(str(tmp_path))
+    array_cache.store("key", make_arrays(100))
+
+    with open(array_cache.path("key"), "r+b") as file:
+        file.truncate(20)
+
+    assert array_cache.load("key") is None
+    assert not os.path.exists(array_cache.path("key"))
+
+# entries are evicted least recently used first, and a hit counts as a use
+def test_trim_evicts_least_recently_used(tmp_path):
+    array_cache = cache.ArrayCache(str(tmp_path), max_size=1 << 40)
+
+    for index, key in enumerate(("a", "b", "c")):
+        array_cache.store(key, make_arrays(1000))
+        set_mtime(array_cache, key, 1000 + index)
+
+    array_cache.load("a")
+    array_cache.max_size = 2 * os.path.getsize(array_cache.path("a"))
+    array_cache.trim()
+
+    assert array_cache.load("b") is None
+    assert array_cache.load("a") is not None
+    assert array_cache.load("c") is not None
+
+def test_trim_under_max_size_keeps_everything(tmp_path):
+    array_cache = cache.ArrayCache(str(tmp_path))
+
+    for key in ("a", "b", "c"):
+        array_cache.store(key, make_arrays(1000))
+
+    array_cache.trim()
+
+    assert sorted(os.listdir(str(tmp_path))) == ["a.npz", "b.npz", "c.npz"]
@@ -0,0 +1,158 @@
+import pytest
+import numpy as np
+import synthetic
+
+codec = synthetic.load_module("codec")
+data = synthetic.load_module("data")
+proto = synthetic.load_module("proto")
+
+def test_detect_mode_json():
+    assert codec.detect_mode(b'{"vertices": []}') == 'JSON'
+    assert codec.detect_mode(b'\n  {"vertices": []}\n') == 'JSON'
+    assert codec.detect_mode(b'[]') == 'JSON'
+
+def test_detect_mode_binary():
+    assert codec.detect_mode(codec.encode_model(synthetic.make_mesh(100))) == 'BINARY'
+    assert codec.detect_mode(codec.encode_rig(synthetic.make_rig(10))) == 'BINARY'
+    assert codec.detect_mode(codec.encode_animation(synthetic.make_animation(5, 10))) == 'BINARY'
+
+# a first vertex group of exactly 123 bytes encodes as b"\n{"
+def test_detect_mode_binary_with_brace_length():
+    rig = data.Rig(names=["ROOT"], origin_labels=[[1] * 112], labels=[[2]])
+    buffer = codec.encode_rig(rig, 'BINARY')
+
+    assert buffer[:2] == b"\n{"
+    assert codec.detect_mode(buffer) == 'BINARY'
+    assert codec.decode_rig(buffer).to_dict() == rig.to_dict()
+
+@pytest.mark.parametrize("mode", ['BINARY', 'JSON'])
+def test_model_round_trip(mode):
+    mesh = synthetic.make_mesh(1000)
+    mesh.texture_faces = data.int_column([[0, 1, 2], [3, 4, 5]], 3)
+
+    decoded = codec.decode_model(codec.encode_model(mesh, mode))
+
+    assert decoded.to_dict() == mesh.to_dict()
+
+def test_model_round_trip_empty():
+    assert codec.decode_model(codec.encode_model(data.Mesh())).to_dict() == data.Mesh().to_dict()
+
+# unknown and out of order fields take the generic decoder
+def test_model_decode_unusual_layout():
+    mesh = synthetic.make_mesh(10)
+    message = proto.decode("Mesh", codec.encode_model(mesh))
+    buffer = bytearray()
+
+    for vertex in message["vertices"]:
+        item = bytearray()
+        proto.write_bytes(item, 9, b"extra")
+        for number, name in ((4, "label"), (3, "z"), (2, "y"), (1, "x")):
+            proto.write_tag(item, number, proto.WIRE_VARINT)
+            proto.write_varint(item, vertex[name] if number == 4 else proto.zigzag_encode(vertex[name]))
+        proto.write_bytes(buffer, 1, item)
+
+    for face in message["faces"]:
+        proto.write_bytes(buffer, 2, proto.encode("Face", face))
+
+    assert proto.decode_mesh_tables(bytes(buffer)) is None
+    assert codec.decode_model(bytes(buffer)).to_dict() == mesh.to_dict()
+
+def test_model_decode_truncated():
+    buffer = codec.encode_model(synthetic.make_mesh(10))
+
+    with pytest.raises(ValueError):
+        codec.decode_model(buffer[:-1])
+
+def test_model_double_sided_faces_become_backfaces():
+    mesh = data.Mesh(
+        vertices=[[0, 0, 0], [1, 0, 0], [0, 1, 0]],
+        faces=[[0, 1, 2]],
+        face_color=[5],
+        face_double_sided=[True],
+    )
+
+    decoded = codec.decode_model(codec.encode_model(mesh, 'BINARY'))
+
+    assert decoded.faces.tolist() == [[0, 1, 2], [2, 1, 0]]
+    assert decoded.face_color.tolist() == [5, 5]
+
+@pytest.mark.parametrize("mode", ['BINARY', 'JSON'])
+def test_rig_round_trip(mode):
+    rig = synthetic.make_rig(20)
+    rig.inherit_scale[3] = True
+
+    decoded = codec.decode_rig(codec.encode_rig(rig, mode))
+
+    assert decoded.to_dict() == rig.to_dict()
+    assert decoded.parents == rig.parents
+
+def test_rig_legacy_bones():
+    rig = codec.decode_rig(b'''{"bones": [
+        {"name": "ROOT", "root": true, "origins": [0]},
+        {"name": "arm", "parent": "ROOT", "origins": [1, 2], "rotates": [3]}
+    ]}''')
+
+    assert rig.names == ["ROOT", "arm"]
+    assert rig.parents == [None, "ROOT"]
+    assert rig.root.tolist() == [True, False]
+    assert rig.get_origin_labels(1) == [1, 2]
+    assert rig.get_labels(1) == [3]
+
+@pytest.mark.parametrize("mode", ['BINARY', 'JSON'])
+def test_animation_round_trip(mode):
+    archive = synthetic.make_animation(5, 10)
+
+    decoded = codec.decode_animation(codec.encode_animation(archive, mode))
+
+    assert decoded.to_dict() == archive.to_dict()
+
+def make_sparse_animation():
+    archive = synthetic.make_animation(20, 30)
+    frames = archive.frames
+    rng = np.random.default_rng(0)
+
+    frames.present &= rng.random(frames.present.shape) < 0.7
+    frames.groups = ["arm", "body"]
+    frames.alphas = rng.integers(-300, 300, (len(frames), 2)).astype(np.int32)
+    frames.alpha_present = rng.random((len(frames), 2)) < 0.5
+    frames.durations = rng.integers(0, 200, len(frames)).astype(np.int32)
+
+    return archive
+
+def test_animation_fast_path_matches_generic():
+    archive = make_sparse_animation()
+    buffer = codec.encode_animation(archive, 'BINARY')
+
+    assert buffer == proto.encode("AnimationArchive", archive.to_dict())
+    assert codec.decode_animation(buffer).to_dict() == archive.to_dict()
+
+# names outside of ASCII and fields the fast path doesn't expect take the
+# generic codec
+def test_animation_generic_fallback():
+    archive = make_sparse_animation()
+    archive.frames.bones[0] = "händ"
+
+    assert proto.encode_animation(archive) is None
+    assert codec.decode_animation(codec.encode_animation(archive, 'BINARY')).to_dict() == archive.to_dict()
+
+    buffer = codec.encode_animation(make_sparse_animation(), 'BINARY') + b"\x20\x01"
+
+    assert proto.decode_animation_tables(buffer) is None
+    assert codec.decode_animation(buffer).to_dict() == make_sparse_animation().to_dict()
+
+def test_model_decode_invalid_face():
+    mesh = synthetic.make_mesh(10)
+    mesh.faces[3, 1] = mesh.vertex_count
+
+    for mode in ('BINARY', 'JSON'):
+        with pytest.raises(ValueError):
+            codec.decode_model(codec.encode_model(mesh, mode))
+
+@pytest.mark.parametrize("buffer", [b"[]", b"[1, 2]", b'"mesh"'])
+def test_decode_json_not_an_object(buffer):
+    with pytest.raises(ValueError):
+        codec.decode_model(buffer, 'JSON')
+    with pytest.raises(ValueError):
+        codec.decode_rig(buffer, 'JSON')
+    with pytest.raises(ValueError):
+        codec.decode_animation(buffer, 'JSON')
@@ -0,0 +1,94 @@
+import os
+import json
+import synthetic
+
+codec = synthetic.load_module("codec")
+convert = synthetic.load_module("convert")
+
+LEGACY_RIG = {"bones": [
+    {"name": "ROOT", "root": True, "origins": [0]},
+    {"name": "arm", "parent": "ROOT", "origins": [1], "rotates": [2]},
+]}
+
+def write(path, buffer):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as file:
+        file.write(buffer)
+
+def make_tree(root):
+    write(os.path.join(root, "a.mdl"), codec.encode_model(synthetic.make_mesh(100), 'JSON'))
+    write(os.path.join(root, "nested", "b.mdl"), codec.encode_model(synthetic.make_mesh(200, seed=1), 'JSON'))
+    write(os.path.join(root, "nested", "c.rig"), codec.encode_rig(synthetic.make_rig(10), 'JSON'))
+    write(os.path.join(root, "notes.txt"), b"not an asset")
+
+def modes(root):
+    result = {}
+    for path in convert.find_files(root):
+        with open(os.path.join(root, path), "rb") as file:
+            result[path] = codec.detect_mode(file.read())
+    return result
+
+def test_convert_tree(tmp_path):
+    source, destination = str(tmp_path / "source"), str(tmp_path / "destination")
+    make_tree(source)
+
+    counts = convert.convert(source, destination, 'BINARY', jobs=1, verbose=False)
+
+    assert counts == {"converted": 3, "unchanged": 0, "skipped": 0, "failed": 0}
+    assert modes(destination) == {
+        "a.mdl": 'BINARY',
+        os.path.join("nested", "b.mdl"): 'BINARY',
+        os.path.join("nested", "c.rig"): 'BINARY',
+    }
+    assert codec.read_model(os.path.join(destination, "a.mdl")).to_dict() == codec.read_model(os.path.join(source, "a.mdl")).to_dict()
+
+def test_convert_skips_up_to_date_outputs(tmp_path):
+    source, destination = str(tmp_path / "source"), str(tmp_path / "destination")
+    make_tree(source)
+
+    convert.convert(source, destination, 'BINARY', jobs=1, verbose=False)
+
+    assert convert.convert(source, destination, 'BINARY', jobs=1, verbose=False)["skipped"] == 3
+    assert convert.convert(source, destination, 'BINARY', jobs=1, force=True, verbose=False)["unchanged"] == 3
+
+# outputs from an earlier run with another --to aren't up to date
+def test_convert_redoes_outputs_in_the_other_encoding(tmp_path):
+    source, destination = str(tmp_path / "source"), str(tmp_path / "destination")
+    make_tree(source)
+
+    convert.convert(source, destination, 'BINARY', jobs=1, verbose=False)
+    counts = convert.convert(source, destination, 'JSON', jobs=1, verbose=False)
+
+    assert counts["skipped"] == 0
+    assert set(modes(destination).values()) == {'JSON'}
+
+def test_convert_fails_single_files(tmp_path):
+    source, destination = str(tmp_path / "source"), str(tmp_path / "destination")
+    make_tree(source)
+    write(os.path.join(source, "broken.mdl"), b'{"vertices": [[0, 0, 0]], "faces": [[0, 1, 2]]}')
+    write(os.path.join(source, "legacy.rig"), json.dumps(LEGACY_RIG).encode("utf-8"))
+
+    counts = convert.convert(source, destination, 'BINARY', jobs=1, verbose=False)
+
+    assert counts == {"converted": 3, "unchanged": 0, "skipped": 0, "failed": 2}
+    assert not os.path.exists(os.path.join(destination, "broken.mdl"))
+    assert not os.path.exists(os.path.join(destination, "legacy.rig"))
+
+def test_convert_file_reports_the_error(tmp_path):
+    source = str(tmp_path / "legacy.rig")
+    write(source, json.dumps(LEGACY_RIG).encode("utf-8"))
+
+    result = convert.convert_file((source, str(tmp_path / "out" / "legacy.rig"), 'BINARY', False))
+
+    assert result.status == "failed"
+    assert "root" in result.error
+
+def test_main_exit_code(tmp_path):
+    source, destination = str(tmp_path / "source"), str(tmp_path / "destination")
+    make_tree(source)
+
+    assert convert.main([source, destination, "--to", "json", "-j", "1", "-q"]) == 0
+
+    write(os.path.join(source, "broken.mdl"), b"[]")
+
+    assert convert.main([source, destination, "-j", "1", "-q"]) == 1
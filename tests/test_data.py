@@ -0,0 +1,72 @@
+import numpy as np
+import synthetic
+
+data = synthetic.load_module("data")
+
+def make_label_index():
+    labels = [3, 1, 3, 7, 1, 3]
+    positions = [[0, 0, 0], [2, 0, 0], [3, 0, 0], [0, 0, 9], [4, 0, 0], [6, 3, 0]]
+    return data.LabelIndex(labels, positions)
+
+def test_label_index_groups_vertices():
+    index = make_label_index()
+
+    assert list(index) == [1, 3, 7]
+    assert 3 in index and 2 not in index
+    assert index.get_vertices([3]).tolist() == [0, 2, 5]
+    assert index.get_vertices([7, 1, 7]).tolist() == [3, 1, 4]
+    assert index.get_vertices([2]).tolist() == []
+
+def test_label_index_centroids():
+    index = make_label_index()
+
+    assert index.get_centroid([3]).tolist() == [3.0, 1.0, 0.0]
+    assert index.get_centroid([1, 7]).tolist() == [2.0, 0.0, 3.0]
+    # missing labels are left out, no labels at all is the origin
+    assert index.get_centroid([1, 2]).tolist() == [3.0, 0.0, 0.0]
+    assert index.get_centroid([2]).tolist() == [0.0, 0.0, 0.0]
+
+def test_label_index_matches_a_scan():
+    mesh = synthetic.make_mesh(2000)
+    index = data.LabelIndex(mesh.vertex_label, mesh.vertices)
+
+    for label in (0, 5, 31):
+        expected = np.flatnonzero(mesh.vertex_label == label)
+        assert index.get_vertices([label]).tolist() == expected.tolist()
+        assert np.allclose(index.get_centroid([label]), mesh.vertices[expected].mean(axis=0))
+
+class Bone:
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+
+def test_rig_topology_depth_order():
+    root = Bone("ROOT")
+    spine = Bone("spine", root)
+    bones = [Bone("hand", Bone("arm")), Bone("head", spine), spine, root, Bone("arm", spine)]
+    bones[0].parent = bones[4]
+
+    topology = data.RigTopology.from_bones(bones)
+
+    assert topology.roots() == ["ROOT"]
+    assert topology.children["spine"] == ["head", "arm"]
+    assert topology.depth_order() == ["ROOT", "spine", "head", "arm", "hand"]
+
+# bones whose parent isn't part of the rig are roots of their own
+def test_rig_topology_missing_parent():
+    topology = data.RigTopology([("arm", "spine"), ("hand", "arm")])
+
+    assert topology.roots() == ["arm"]
+    assert topology.depth_order() == ["arm", "hand"]
+
+def test_rig_topology_allocates_free_ids():
+    topology = data.RigTopology([])
+    topology.reserve_id(0)
+    topology.reserve_id(2)
+
+    assert [topology.allocate_id() for _ in range(3)] == [1, 3, 4]
+
+    for id in range(topology.MAX_ID):
+        topology.reserve_id(id)
+
+    assert topology.allocate_id() is None
@@ -0,0 +1,73 @@
+import numpy as np
+import synthetic
+
+data = synthetic.load_module("data")
+optimize = synthetic.load_module("optimize")
+
+# the faces of a mesh as sets of corner positions and face attributes, which
+# optimizing must keep apart from welds, drops and reordering
+def triangles(mesh):
+    return sorted(
+        (tuple(map(tuple, mesh.vertices[face].tolist())), tuple(mesh.vertex_label[face].tolist()), color)
+        for face, color in zip(mesh.faces, mesh.face_color.tolist())
+    )
+
+def test_weld_vertices():
+    mesh = data.Mesh(
+        vertices=[[0, 0, 0], [8, 0, 0], [0, 8, 0], [8, 0, 0], [8, 0, 0]],
+        vertex_label=[0, 0, 0, 0, 1],
+        faces=[[0, 1, 2], [0, 3, 2], [0, 4, 2]],
+    )
+
+    welded = optimize.weld_vertices(mesh)
+
+    # the same position with another label is another vertex
+    assert welded.vertex_count == 4
+    assert welded.faces.tolist() == [[0, 1, 2], [0, 1, 2], [0, 3, 2]]
+    assert triangles(welded) == triangles(mesh)
+
+def test_remove_degenerate_faces():
+    mesh = data.Mesh(
+        vertices=[[0, 0, 0], [8, 0, 0], [0, 8, 0], [16, 0, 0]],
+        faces=[[0, 1, 2], [0, 0, 2], [0, 1, 3]],
+    )
+
+    assert optimize.remove_degenerate_faces(mesh).faces.tolist() == [[0, 1, 2]]
+
+def test_remove_duplicate_faces_keeps_backfaces():
+    mesh = data.Mesh(
+        vertices=[[0, 0, 0], [8, 0, 0], [0, 8, 0]],
+        faces=[[0, 1, 2], [1, 2, 0], [2, 1, 0]],
+    )
+
+    assert optimize.remove_duplicate_faces(mesh).faces.tolist() == [[0, 1, 2], [2, 1, 0]]
+
+def test_optimize_keeps_the_surface():
+    mesh = synthetic.make_mesh(2000)
+
+    optimized = optimize.optimize_mesh(mesh)
+
+    assert optimized.face_count == mesh.face_count
+    assert optimized.vertex_count == mesh.vertex_count
+    assert triangles(optimized) == triangles(mesh)
+
+def test_reorder_keeps_unused_vertices():
+    mesh = data.Mesh(
+        vertices=[[0, 0, 0], [99, 99, 99], [8, 0, 0], [0, 8, 0]],
+        vertex_label=[0, 7, 0, 0],
+        faces=[[0, 2, 3]],
+    )
+
+    reordered = optimize.reorder_for_cache(mesh)
+
+    assert reordered.vertices[-1].tolist() == [99, 99, 99]
+    assert reordered.vertex_label[-1] == 7
+
+def test_remap_vertices_remaps_texture_faces():
+    mesh = synthetic.make_mesh(200)
+    mesh.texture_faces = data.int_column([[0, 1, 2], [5, 9, 3]], 3)
+    positions = mesh.vertices[mesh.texture_faces].tolist()
+
+    optimized = optimize.optimize_mesh(mesh)
+
+    assert optimized.vertices[optimized.texture_faces].tolist() == positions
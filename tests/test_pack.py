@@ -0,0 +1,38 @@
+import pytest
+import synthetic
+
+pack = synthetic.load_module("pack")
+
+def read_models(filepath):
+    with pack.PackFile(filepath) as pack_file:
+        return {name: pack_file.read_model(name, verify=True).to_dict() for name in pack_file.names()}
+
+def test_pack_write_read(tmp_path):
+    filepath = str(tmp_path / "models.rspk")
+    models = {"small": synthetic.make_mesh(10), "large": synthetic.make_mesh(1000, seed=1)}
+
+    pack.write_models(filepath, models)
+
+    assert read_models(filepath) == {name: mesh.to_dict() for name, mesh in models.items()}
+
+def test_pack_replace(tmp_path):
+    filepath = str(tmp_path / "models.rspk")
+    kept = synthetic.make_mesh(10)
+    replaced = synthetic.make_mesh(1000, seed=1)
+
+    pack.write_models(filepath, {"kept": kept, "replaced": synthetic.make_mesh(10, seed=2)})
+    pack.write_model(filepath, "replaced", replaced)
+
+    assert read_models(filepath) == {"kept": kept.to_dict(), "replaced": replaced.to_dict()}
+
+    pack.compact(filepath)
+
+    assert read_models(filepath) == {"kept": kept.to_dict(), "replaced": replaced.to_dict()}
+
+def test_pack_missing_model(tmp_path):
+    filepath = str(tmp_path / "models.rspk")
+    pack.write_model(filepath, "model", synthetic.make_mesh(10))
+
+    with pack.PackFile(filepath) as pack_file:
+        with pytest.raises(KeyError):
+            pack_file.read_model("other")
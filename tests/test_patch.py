@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+import synthetic
+
+codec = synthetic.load_module("codec")
+data = synthetic.load_module("data")
+patch = synthetic.load_module("patch")
+
+def copy_mesh(mesh):
+    return data.Mesh.from_dict(mesh.to_dict())
+
+def round_trip(base, mesh):
+    buffer = patch.encode_patch(patch.make_patch(base, mesh))
+    return patch.apply_patch(base, patch.decode_patch(buffer))
+
+def test_patch_edits():
+    base = synthetic.make_mesh(1000)
+    mesh = copy_mesh(base)
+    mesh.vertices[10:14] += 1
+    mesh.face_color[[5, 7, 700]] = 1
+
+    model_patch = patch.make_patch(base, mesh)
+
+    # faces 5 and 7 are one range with the unchanged 6 between them
+    assert model_patch.record_count() == 4 + 3 + 1
+    assert codec.encode_model(round_trip(base, mesh)) == codec.encode_model(mesh)
+
+def test_patch_unchanged():
+    base = synthetic.make_mesh(100)
+
+    assert patch.make_patch(base, copy_mesh(base)).record_count() == 0
+    assert codec.encode_model(round_trip(base, base)) == codec.encode_model(base)
+
+@pytest.mark.parametrize("face_count", [50, 2000])
+def test_patch_resize(face_count):
+    base = synthetic.make_mesh(1000)
+    mesh = synthetic.make_mesh(face_count, seed=1)
+
+    assert codec.encode_model(round_trip(base, mesh)) == codec.encode_model(mesh)
+
+def test_patch_wrong_base():
+    base = synthetic.make_mesh(100)
+    mesh = copy_mesh(base)
+    mesh.face_color[0] += 1
+
+    with pytest.raises(patch.PatchError):
+        patch.apply_patch(mesh, patch.make_patch(base, mesh))
+
+def test_patch_range_past_end():
+    base = synthetic.make_mesh(100)
+    model_patch = patch.make_patch(base, base)
+    model_patch.vertex_ranges.append((base.vertex_count, np.zeros((1, 4), dtype=np.int64)))
+
+    with pytest.raises(patch.PatchError):
+        patch.apply_patch(base, model_patch, verify=False)
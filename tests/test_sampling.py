@@ -0,0 +1,83 @@
+import numpy as np
+import synthetic
+
+codec = synthetic.load_module("codec")
+sampling = synthetic.load_module("sampling")
+
+def make_samples(name, locations, rotations=None, durations=None):
+    locations = np.asarray(locations, dtype=np.float64).reshape(-1, 3)
+    count = len(locations)
+    channels = {("arm", "location"): locations}
+    if rotations is not None:
+        channels[("arm", "rotation_euler")] = np.asarray(rotations, dtype=np.float64).reshape(-1, 3)
+    if durations is None:
+        durations = np.ones(count, dtype=np.int32)
+    return sampling.ActionSamples(name, np.arange(count, dtype=np.int32), np.asarray(durations, dtype=np.int32), channels)
+
+def test_frame_table_interns_identical_poses():
+    walk = make_samples("walk", [[0, 0, 0], [8, 0, 0], [0, 0, 0]])
+    idle = make_samples("idle", [[8, 0, 0], [16, 0, 0]], durations=[3, 5])
+
+    archive = sampling.build_archive([walk, idle])
+
+    assert len(archive.frames) == 3
+    assert archive.animations["walk"].frames.tolist() == [[0, 0, 1], [1, 1, 1], [0, 0, 1]]
+    assert archive.animations["idle"].frames.tolist() == [[1, 1, 3], [2, 2, 5]]
+
+def test_frame_table_keys_on_presence():
+    table = sampling.FrameTable()
+    frames = sampling.quantize_frames(make_samples("walk", [[0, 0, 0], [0, 0, 0]]), ["arm", "leg"])
+    frames.present[1, 1, 0] = True
+
+    assert table.intern(frames, 0) == 0
+    assert table.intern(frames, 1) == 1
+    assert table.intern(frames, 0) == 0
+    assert len(table.to_frames(["arm", "leg"])) == 2
+
+def test_build_archive_round_trip():
+    samples = make_samples("walk", np.arange(30).reshape(10, 3), rotations=np.linspace(0, 3, 30).reshape(10, 3))
+
+    archive = sampling.build_archive([samples])
+    decoded = codec.decode_animation(codec.encode_animation(archive))
+
+    assert decoded.to_dict() == archive.to_dict()
+    # rotate and translate are keyed, scale isn't
+    assert decoded.frames.present[:, 0].tolist() == [[True, True, False]] * 10
+
+def test_reduce_drops_linear_frames():
+    samples = make_samples("walk", [[x * 4, 0, 0] for x in range(10)] + [[36, 8, 0]], durations=[1] * 10 + [3])
+
+    reduced, error = sampling.reduce_samples(samples, 0.0)
+
+    assert reduced.frames.tolist() == [0, 9, 10]
+    assert reduced.durations.tolist() == [9, 1, 3]
+    assert reduced.channels[("arm", "location")].tolist() == [[0, 0, 0], [36, 0, 0], [36, 8, 0]]
+    assert error == 0.0
+
+def test_reduce_keeps_frames_outside_the_tolerance():
+    locations = [[0, 0, 0], [4, 0, 0], [8, 3, 0], [12, 0, 0], [16, 0, 0]]
+
+    assert sampling.reduce_samples(make_samples("walk", locations), 2.0)[0].frames.tolist() == [0, 2, 4]
+
+    reduced, error = sampling.reduce_samples(make_samples("walk", locations), 3.0)
+
+    assert reduced.frames.tolist() == [0, 4]
+    assert error == 3.0
+
+# 2047 to 1 is a step of two across the wrap, not of 2046 back
+def test_reduce_wraps_rotations():
+    turn = 2048 / (2 * np.pi)
+    rotations = [[angle / turn, 0, 0] for angle in (2043, 2045, 2047, 1, 3, 5)]
+
+    reduced, _ = sampling.reduce_samples(make_samples("spin", [[0, 0, 0]] * 6, rotations=rotations), 0.0)
+
+    assert reduced.frames.tolist() == [0, 5]
+
+def test_reduce_short_and_static_samples():
+    assert sampling.reduce_samples(make_samples("pose", [[1, 2, 3]] * 2), 0.0)[0].frames.tolist() == [0, 1]
+
+    reduced, error = sampling.reduce_samples(make_samples("idle", [[1, 2, 3]] * 4000), 0.0)
+
+    assert reduced.frames.tolist() == [0, 3999]
+    assert reduced.durations.sum() == 4000
+    assert error == 0.0
@@ -1,5 +1,7 @@
-
 import os
+import math
+import threading
+import numpy as np
 
 def export_vector(a):
     x = +int(a[0] + 0.5)
@@ -7,6 +9,19 @@ def export_vector(a):
     z = +int(a[1] + 0.5)
     return (x, y, z)
 
+# vectorized export_vector, for an (n, 3) or flat array of blender coordinates
+def export_vectors(a):
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 3)
+    rounded = (a + 0.5).astype(np.int32)
+    return np.stack((rounded[:, 0], -rounded[:, 2], rounded[:, 1]), axis=1)
+
+# palette color of an (n, 2) array of uvs, the inverse of the uvs set on import
+def export_colors(uv):
+    uv = np.asarray(uv, dtype=np.float64)
+    u = (uv[:, 0] * 128).astype(np.int32)
+    v = 511 - (uv[:, 1] * 512).astype(np.int32)
+    return u + (v * 128)
+
 def export_angle(radian_angle, min_value=0, max_value=2047):
     normalized_angle = radian_angle % (2 * math.pi)
     int_angle = int((normalized_angle * 325.94932345220164765467394738691) + 0.5)
@@ -20,6 +35,20 @@ def export_euler(euler):
         -export_angle(euler[2]),
     )
 
+# vectorized export_euler, for an (n, 3) array of ZXY eulers
+def export_eulers(eulers):
+    eulers = np.asarray(eulers, dtype=np.float64).reshape(-1, 3)
+    normalized = np.mod(eulers, 2 * math.pi)
+    angles = ((normalized * 325.94932345220164765467394738691) + 0.5).astype(np.int32)
+    angles[:, 2] = -angles[:, 2]
+    return angles
+
+# scales are fixed point with 128 being 1.0, on the same axes as export_vector
+def export_scales(scales):
+    scales = np.asarray(scales, dtype=np.float64).reshape(-1, 3)
+    rounded = ((scales * 128) + 0.5).astype(np.int32)
+    return np.stack((rounded[:, 0], rounded[:, 2], rounded[:, 1]), axis=1)
+
 def filename_without_extension(filepath):
     filename, _ = os.path.splitext(os.path.basename(filepath))
     return filename
@@ -29,3 +58,31 @@ def export_array(input):
     for value in input:
         array.append(value)
     return array
+
+# Writes through a temp file next to the target and renames it over the
+# target, so readers see either the old or the new file and never a partial one.
+def write_atomic(filepath, buffer):
+    temp_path = "{}.{}.{}.tmp".format(filepath, os.getpid(), threading.get_ident())
+    try:
+        with open(temp_path, "wb") as file:
+            file.write(buffer)
+        os.replace(temp_path, filepath)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+# Returns whether the file was written, files that already hold these exact
+# bytes are left alone so their mtime and watchers stay quiet.
+def write_if_changed(filepath, buffer):
+    try:
+        if os.path.getsize(filepath) == len(buffer):
+            with open(filepath, "rb") as file:
+                if file.read() == buffer:
+                    return False
+    except OSError:
+        pass
+
+    os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+    write_atomic(filepath, buffer)
+    return True
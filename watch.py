@@ -0,0 +1,237 @@
+import os
+import bpy
+import time
+
+from . import model, codec, util
+from bpy.types import Panel, PropertyGroup
+from bpy.props import StringProperty, BoolProperty, FloatProperty, EnumProperty, PointerProperty
+from bpy.app.handlers import persistent
+
+# Watch mode: meshes marked for auto export are re-exported to the watch
+# folder shortly after they change. The depsgraph handler only records what
+# changed, the debounced timer does the exporting, so a drag in the viewport
+# costs one export once it settles rather than one per redraw.
+#
+# Only geometry, material and rig changes touch the exported file, models are
+# written in object space, so transform-only changes are counted and ignored.
+
+# object name -> True for geometry changes, False for transform-only ones
+pending = {}
+last_change = 0.0
+
+class WatchStats:
+    __slots__ = ("exported", "unchanged", "transforms")
+
+    def __init__(self):
+        self.exported = 0
+        self.unchanged = 0
+        self.transforms = 0
+
+stats = WatchStats()
+
+def get_target_path(settings, obj):
+    name = bpy.path.clean_name(obj.rs_export_name or obj.name)
+    return os.path.join(bpy.path.abspath(settings.directory), name + ".mdl")
+
+def mark(obj, geometry):
+    global last_change
+    pending[obj.name] = pending.get(obj.name, False) or geometry
+    last_change = time.monotonic()
+
+@persistent
+def on_depsgraph_update(scene, depsgraph):
+    settings = scene.rs_watch
+
+    if not settings.enabled or not settings.directory:
+        return
+
+    # playback re-evaluates every deformed mesh on every frame
+    screen = bpy.context.screen
+    if screen and screen.is_animation_playing:
+        return
+
+    watched = [obj for obj in scene.objects if obj.rs_auto_export and obj.type == 'MESH']
+
+    if not watched:
+        return
+
+    changed = False
+    updated = {update.id.original for update in depsgraph.updates}
+
+    for update in depsgraph.updates:
+        id = update.id.original
+
+        if isinstance(id, bpy.types.Object):
+            if id.rs_auto_export and id.type == 'MESH':
+                # posing re-evaluates the meshes the armature deforms, the
+                # exported mesh data itself is the same
+                geometry = update.is_updated_geometry
+                if geometry and id.data not in updated and id.find_armature() in updated:
+                    geometry = False
+                mark(id, geometry)
+                changed = True
+            elif id.type == 'ARMATURE' and update.is_updated_geometry and id.mode != 'POSE':
+                # rest bone heads and labels are part of the model, poses are not
+                for obj in watched:
+                    if obj.find_armature() == id:
+                        mark(obj, True)
+                        changed = True
+
+        elif isinstance(id, bpy.types.Material):
+            # alpha and sidedness come from the face group materials
+            for obj in watched:
+                if any(slot.material == id for slot in obj.material_slots):
+                    mark(obj, True)
+                    changed = True
+
+    if changed and not bpy.app.timers.is_registered(flush):
+        bpy.app.timers.register(flush, first_interval=settings.delay)
+
+@persistent
+def on_load(*args):
+    pending.clear()
+
+def flush():
+    scene = bpy.context.scene
+    settings = getattr(scene, "rs_watch", None)
+
+    if settings is None or not settings.enabled:
+        pending.clear()
+        return None
+
+    # still changing, come back once it has been quiet for the delay
+    remaining = settings.delay - (time.monotonic() - last_change)
+    if remaining > 0:
+        return remaining
+
+    for name, geometry in list(pending.items()):
+        obj = bpy.data.objects.get(name)
+
+        if obj is None or not obj.rs_auto_export:
+            del pending[name]
+            continue
+
+        if not geometry:
+            stats.transforms += 1
+            del pending[name]
+            continue
+
+        # edit mode keeps its changes in the edit mesh, export once it is left
+        if obj.mode == 'EDIT':
+            continue
+
+        del pending[name]
+        export(settings, obj)
+
+    # objects in edit mode are retried until they leave it
+    if pending:
+        return settings.delay
+
+    return None
+
+def export(settings, obj):
+    snapshot = model.export_object(obj)
+
+    if snapshot is None:
+        return
+
+    filepath = get_target_path(settings, obj)
+
+    try:
+        buffer = codec.encode_model(model.finish_model(snapshot, settings.optimize_mesh), settings.mode)
+        written = util.write_if_changed(filepath, buffer)
+    except (OSError, ValueError) as error:
+        print("Unable to auto export", obj.name, "to", filepath, error)
+        return
+
+    if written:
+        stats.exported += 1
+        print("Auto exported", obj.name, "to", filepath)
+    else:
+        stats.unchanged += 1
+
+class RS_WatchSettings(PropertyGroup):
+    enabled: BoolProperty(
+        name="Watch",
+        description="Re-exports auto export meshes to the watch folder whenever they change",
+        default=False,
+    )
+
+    directory: StringProperty(
+        name="Folder",
+        description="Folder the auto exported models are written to",
+        subtype='DIR_PATH',
+        default="",
+    )
+
+    mode: EnumProperty(
+        name="Format",
+        items=(
+            ('BINARY', "Binary", "Protobuf encoded Mesh message"),
+            ('JSON', "JSON", "Legacy JSON encoding"),
+        ),
+        default='BINARY',
+    )
+
+    optimize_mesh: model.OPTIMIZE_MESH
+
+    delay: FloatProperty(
+        name="Delay",
+        description="Seconds without changes before an export",
+        default=0.5,
+        min=0.0,
+        subtype='TIME_ABSOLUTE',
+    )
+
+class RS_PT_Watch(Panel):
+    bl_idname = "RS_PT_Watch"
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = 'UI'
+    bl_category = "Rune Synergy"
+    bl_label = "Auto Export"
+
+    def draw(self, context):
+        layout = self.layout
+        settings = context.scene.rs_watch
+
+        layout.prop(settings, "enabled")
+        layout.prop(settings, "directory")
+
+        row = layout.row()
+        row.prop(settings, "mode", text="")
+        row.prop(settings, "optimize_mesh")
+        layout.prop(settings, "delay")
+
+        obj = context.object
+
+        if obj and obj.type == 'MESH':
+            box = layout.box()
+            box.prop(obj, "rs_auto_export")
+            if obj.rs_auto_export:
+                box.prop(obj, "rs_export_name")
+                if settings.directory:
+                    box.label(text=os.path.basename(get_target_path(settings, obj)))
+
+        if settings.enabled:
+            layout.label(text="{} exported, {} unchanged, {} moves skipped, {} pending".format(
+                stats.exported, stats.unchanged, stats.transforms, len(pending)))
+
+__classes__ = (
+    RS_WatchSettings,
+    RS_PT_Watch,
+)
+
+__properties__ = {
+    bpy.types.Scene: {
+        "rs_watch": PointerProperty(type=RS_WatchSettings),
+    },
+    bpy.types.Object: {
+        "rs_auto_export": BoolProperty(name="Auto Export", description="Re-export this mesh to the watch folder whenever it changes", default=False),
+        "rs_export_name": StringProperty(name="File Name", description="Name of the exported file, the object name when empty", default=""),
+    },
+}
+
+__hooks__ = {
+    "depsgraph_update_post": [on_depsgraph_update],
+    "load_post": [on_load],
+}